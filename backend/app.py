@@ -1,15 +1,34 @@
 import os
+import io
+import csv
 import json
+import struct
 import time
+import zlib
 import logging
-import random
 import threading
 from queue import Queue, Empty, Full
 from datetime import datetime, timedelta, timezone
-from flask import Flask, request, jsonify, Response, send_from_directory
+from flask import Flask, g, request, jsonify, Response, send_from_directory, stream_with_context
 from flask_cors import CORS
 from functools import wraps
-from models import db, DeviceData
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from models import db, Device, DeviceData, DeviceRollup
+from ingest_buffer import IngestBuffer
+from pubsub import create_pubsub
+from downsample import bucket_aggregate, bucket_combine, lttb_indices
+from rollup import apply_rollups, pick_resolution, ROLLUP_RESOLUTIONS, ROLLUP_STATS
+from device_registry import rebuild as rebuild_devices, upsert_devices
+from latest_cache import LatestCache
+from response_cache import ResponseCache
+from retention import RetentionJob, is_partitioned
+from sqlite_writer import SQLiteWriter, configure_sqlite
+import datagen
+import metrics
+from log_config import configure_logging
+from ingest_schema import READING_SCHEMA, METRIC_FIELDS, BINARY_CONTENT_TYPE, decode_binary, loads as json_loads
 
 # 台灣時區 (UTC+8)
 TAIWAN_TZ = timezone(timedelta(hours=8))
@@ -31,13 +50,14 @@ def to_taiwan_time(dt):
         dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(TAIWAN_TZ)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# Configure logging: text (synchronous, every line) or structured (JSON, queued, sampled per device)
+LOG_MODE = os.getenv('LOG_MODE', 'text').lower()
+log_handler = configure_logging(LOG_MODE, os.getenv('LOG_LEVEL', 'INFO').upper(),
+                                sample_interval_s=float(os.getenv('LOG_SAMPLE_INTERVAL_S', '10')),
+                                sampled_logger=f'{__name__}.ingest')
 logger = logging.getLogger(__name__)
+# Per-request ingest logs: lazy %-formatting with the device in `extra` so they can be sampled
+ingest_logger = logger.getChild('ingest')
 
 app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
 
@@ -53,11 +73,35 @@ API_KEY = os.getenv('API_KEY', 'dev-secret-key')
 cors_env = os.getenv('CORS_ORIGINS', '*')
 CORS_ORIGINS = cors_env.split(',') if cors_env != '*' else '*'
 OFFLINE_THRESHOLD_SECONDS = int(os.getenv('OFFLINE_THRESHOLD_SECONDS', '300'))
+# Write-behind ingest: queue rows in memory and group-commit them in the background
+INGEST_WRITE_BEHIND = os.getenv('INGEST_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+# Maintain 1 min / 1 h / 1 d rollups at ingest time and serve bucketed history from them
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# SSE broadcast backend: local (single worker), unix or postgres (multiple workers)
+SSE_PUBSUB = os.getenv('SSE_PUBSUB', 'local').lower()
+SSE_PUBSUB_DIR = os.getenv('SSE_PUBSUB_DIR', '/tmp/windmill-sse')
+# Latest-reading cache: 'auto' enables it only when SSE_PUBSUB lets every worker see every reading
+LATEST_CACHE = os.getenv('LATEST_CACHE', 'auto').lower()
+LATEST_CACHE_ENABLED = LATEST_CACHE in ('1', 'true', 'yes') or (LATEST_CACHE == 'auto' and SSE_PUBSUB != 'local')
+# Short-TTL cache of /devices, /latest and /history responses with ETags (0 disables)
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '2'))
+# Raw readings older than this many days are reclaimed by the retention job (0 keeps them forever)
+RETENTION_RAW_DAYS = int(os.getenv('RETENTION_RAW_DAYS', '0'))
+RETENTION_INTERVAL_S = int(os.getenv('RETENTION_INTERVAL_S', '3600'))
+RETENTION_BATCH_ROWS = int(os.getenv('RETENTION_BATCH_ROWS', '10000'))
+# SQLite production mode: WAL + pragmas on every connection, and one writer thread per process
+IS_SQLITE = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+SQLITE_WAL = IS_SQLITE and os.getenv('SQLITE_WAL', 'true').lower() in ('1', 'true', 'yes')
+SQLITE_SINGLE_WRITER = SQLITE_WAL and os.getenv('SQLITE_SINGLE_WRITER', 'true').lower() in ('1', 'true', 'yes') \
+    and ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI'] and app.config['SQLALCHEMY_DATABASE_URI'] != 'sqlite://'
 
 logger.info(f"Starting Windmill Monitor API")
 logger.info(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
 logger.info(f"API Key: {API_KEY}")
 logger.info(f"CORS Origins: {CORS_ORIGINS}")
+logger.info(f"SSE pub/sub: {SSE_PUBSUB}")
+if IS_SQLITE:
+    logger.info(f"SQLite mode: wal={SQLITE_WAL}, single_writer={SQLITE_SINGLE_WRITER}")
 
 # Initialize database
 db.init_app(app)
@@ -67,14 +111,26 @@ CORS(app,
      origins="*",
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
      allow_headers=["Content-Type", "x-api-key"],
-     expose_headers=["Content-Type"],
+     expose_headers=["Content-Type", "ETag", "Last-Modified"],
      supports_credentials=False,
      max_age=3600)
 
 # Create tables on startup
 with app.app_context():
+    # Before the first connection so the pool gauges count every one
+    metrics.instrument_pool(db.engine)
+    if SQLITE_WAL:
+        configure_sqlite(db.engine,
+                         busy_timeout_ms=int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+                         mmap_size=int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+                         synchronous=os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
     db.create_all()
     logger.info("Database tables created/verified")
+    # Populate the device registry for databases that predate it
+    if Device.query.first() is None and DeviceData.query.first() is not None:
+        logger.info(f"📋 Device registry rebuilt: {rebuild_devices(db.session)} device(s)")
+    with db.engine.connect() as conn:
+        DEVICE_DATA_PARTITIONED = is_partitioned(conn)
 
 # SSE clients management
 sse_clients = {}
@@ -92,15 +148,99 @@ def require_api_key(f):
     return decorated_function
 
 
-def broadcast_to_device_clients(device_id, data):
-    """Send data to all SSE clients subscribed to a device"""
+def sse_frame(data):
+    """Encode an SSE data frame; the same bytes object is shared by every subscriber"""
+    return f"data: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+def deliver_to_local_clients(device_id, frame):
+    """Send an encoded frame to the SSE clients of this process subscribed to a device"""
     with clients_lock:
         if device_id in sse_clients:
             for client_queue in sse_clients[device_id]:
                 try:
-                    client_queue.put_nowait(data)
+                    client_queue.put_nowait(frame)
                 except Full:
-                    pass
+                    metrics.SSE_DROPPED.inc()
+
+
+latest_cache = LatestCache(int(os.getenv('LATEST_CACHE_SIZE', '10000')),
+                           float(os.getenv('LATEST_CACHE_TTL_S', '30'))) if LATEST_CACHE_ENABLED else None
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_TTL, int(os.getenv('RESPONSE_CACHE_SIZE', '1024'))) \
+    if RESPONSE_CACHE_TTL > 0 else None
+
+
+def cache_remote_frame(device_id, frame):
+    """Update the caches from a reading ingested by another worker"""
+    if response_cache is not None:
+        response_cache.invalidate(device_id)
+    data = json.loads(frame[len(b'data: '):])
+    if latest_cache is None or 'timestamp' not in data:
+        return
+    last_seen = datetime.fromisoformat(data['timestamp']).astimezone(timezone.utc).replace(tzinfo=None)
+    latest_cache.put(device_id, last_seen, {f: data.get(f) for f in METRIC_FIELDS})
+
+
+def ensure_latest_cache():
+    """Start receiving other workers' readings, then warm from the device registry (once per process, then every TTL)"""
+    pubsub.start()
+    latest_cache.warm(lambda: (
+        (d.device_id, d.last_seen, {f: getattr(d, f) for f in METRIC_FIELDS})
+        for d in Device.query.order_by(Device.last_seen.desc()).limit(latest_cache.max_size + 1)
+    ))
+
+
+pubsub = create_pubsub(SSE_PUBSUB, deliver_to_local_clients,
+                       database_url=app.config['SQLALCHEMY_DATABASE_URI'],
+                       directory=SSE_PUBSUB_DIR,
+                       on_remote=cache_remote_frame if latest_cache is not None or response_cache is not None else None)
+
+
+def broadcast_to_device_clients(device_id, data):
+    """Send data to all SSE clients subscribed to a device, in every worker"""
+    # Serialize once per reading, not once per subscriber
+    pubsub.publish(device_id, sse_frame(data))
+
+
+def cached_response(per_device=True):
+    """Serve a GET endpoint from the response cache, with ETag / If-None-Match support.
+
+    Entries of per-device endpoints are keyed on the `device_id` query
+    parameter and dropped when that device is written; other entries are
+    dropped on any write. A matching If-None-Match is answered with 304
+    without running the view.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if response_cache is None:
+                return f(*args, **kwargs)
+            # Receive other workers' writes so their invalidations reach this cache
+            pubsub.start()
+            device_id = request.args.get('device_id') if per_device else None
+            key = ResponseCache.make_key(request.path, request.args)
+            entry = response_cache.lookup(key, device_id)
+            if entry is None:
+                # Versions before the view runs, so a write racing it leaves the entry stale
+                versions = response_cache.versions(device_id)
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = response_cache.store(key, versions, response.get_data(), response.mimetype)
+            if entry.etag in request.if_none_match:
+                response_cache.count_not_modified()
+                response = Response(status=304)
+            else:
+                response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            response.headers['Last-Modified'] = entry.last_modified
+            # Clients may keep the body but must revalidate it on every request
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
 
 
 @app.route('/')
@@ -118,110 +258,331 @@ def serve_static(path):
         return send_from_directory(app.static_folder, 'index.html')
 
 
+INGEST_BATCH_MAX = int(os.getenv('INGEST_BATCH_MAX', '1000'))
+# Limit on a gzip-compressed ingest body once decompressed
+INGEST_MAX_BODY_BYTES = int(os.getenv('INGEST_MAX_BODY_BYTES', str(8 * 1024 * 1024)))
+
+# Validate an ingest payload and return DeviceData column values; raises
+# ValueError with a client-facing message on invalid input
+parse_reading = READING_SCHEMA.parse
+
+
+def decoded_reading(values):
+    """parse_reading counterpart for binary bodies, which decode straight to column values"""
+    return values
+
+
+def read_request_body():
+    """The raw request body, decompressed when sent with Content-Encoding: gzip"""
+    body = request.get_data(cache=False)
+    encoding = (request.content_encoding or 'identity').lower()
+    if encoding == 'identity':
+        return body
+    if encoding != 'gzip':
+        raise ValueError(f'Unsupported Content-Encoding: {encoding}')
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, INGEST_MAX_BODY_BYTES)
+    except zlib.error:
+        raise ValueError('Invalid gzip body')
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'Body too large: max {INGEST_MAX_BODY_BYTES} bytes uncompressed')
+    if not decompressor.eof:
+        raise ValueError('Invalid gzip body: truncated')
+    return data
+
+
+def read_ingest_body():
+    """Decode the request body; returns (payload, parse) with parse(reading) -> column values
+
+    JSON bodies (orjson when installed) are validated reading by reading with
+    parse_reading. Binary bodies (BINARY_CONTENT_TYPE) are a list of readings
+    already decoded to column values. Either may be gzip-compressed. Raises
+    ValueError on a malformed body.
+    """
+    if request.mimetype == BINARY_CONTENT_TYPE:
+        return decode_binary(read_request_body()), decoded_reading
+    if not request.is_json:
+        raise ValueError(f'Body must be JSON (Content-Type: application/json) or {BINARY_CONTENT_TYPE}')
+    body = read_request_body()
+    try:
+        return json_loads(body), parse_reading
+    except ValueError:
+        raise ValueError('Invalid JSON body')
+
+
+def build_broadcast_data(values):
+    """Build the SSE payload for a stored reading"""
+    broadcast_data = {
+        'device_id': values['device_id'],
+        'timestamp': to_taiwan_time(values['timestamp']).isoformat()
+    }
+    for field in METRIC_FIELDS:
+        broadcast_data[field] = values[field]
+    return broadcast_data
+
+
+def update_derived_tables(rows):
+    """Keep the device registry and rollups in step with new raw rows (same transaction)"""
+    upsert_devices(db.session, rows)
+    if ROLLUPS_ENABLED:
+        apply_rollups(db.session, rows)
+
+
+def cache_rows(rows):
+    """Update this worker's caches with freshly committed rows (every write path calls this)"""
+    for row in rows:
+        if latest_cache is not None:
+            latest_cache.put(row['device_id'], row['timestamp'], {f: row.get(f) for f in METRIC_FIELDS})
+        if response_cache is not None:
+            response_cache.invalidate(row['device_id'])
+
+
+def broadcast_rows(rows):
+    """Cache and broadcast freshly committed rows to SSE clients"""
+    cache_rows(rows)
+    for row in rows:
+        broadcast_to_device_clients(row['device_id'], build_broadcast_data(row))
+
+
+sqlite_writer = None
+if SQLITE_SINGLE_WRITER:
+    sqlite_writer = SQLiteWriter(app, db, lock_path=f"{make_url(app.config['SQLALCHEMY_DATABASE_URI']).database}.write.lock")
+
+
+def run_write(work):
+    """Run `work()` (writes through db.session, no commit) in a committed transaction; returns its result.
+
+    With the SQLite single writer the transaction runs on the writer thread.
+    """
+    if sqlite_writer is not None:
+        return sqlite_writer.run(work)
+    try:
+        result = work()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+ingest_buffer = None
+if INGEST_WRITE_BEHIND:
+    ingest_buffer = IngestBuffer(
+        app, db, DeviceData,
+        max_size=int(os.getenv('INGEST_QUEUE_MAX', '10000')),
+        flush_rows=int(os.getenv('INGEST_FLUSH_ROWS', '500')),
+        flush_ms=int(os.getenv('INGEST_FLUSH_MS', '200')),
+        before_commit=update_derived_tables,
+        on_flush=broadcast_rows,
+        run_write=run_write if sqlite_writer is not None else None
+    )
+    logger.info(f"Write-behind ingest enabled: queue={ingest_buffer.max_size}, "
+                f"flush_rows={ingest_buffer.flush_rows}, flush_ms={ingest_buffer.flush_ms}")
+
+
+# Partitioned tables also need the job to create upcoming monthly partitions
+retention_job = None
+if RETENTION_RAW_DAYS > 0 or DEVICE_DATA_PARTITIONED:
+    retention_job = RetentionJob(app, db, RETENTION_RAW_DAYS, RETENTION_INTERVAL_S, RETENTION_BATCH_ROWS,
+                                 run_write=run_write if sqlite_writer is not None else None)
+    logger.info(f"Retention enabled: raw_days={RETENTION_RAW_DAYS or 'forever'}, "
+                f"interval={RETENTION_INTERVAL_S}s, partitioned={DEVICE_DATA_PARTITIONED}")
+
+
+@app.before_request
+def start_background_jobs():
+    """Start per-process background jobs on the first request after fork"""
+    if retention_job is not None:
+        retention_job.start()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(
+            time.perf_counter() - started)
+    return response
+
+
+def queue_full_response():
+    """Backpressure response when the write-behind queue cannot take more rows"""
+    response = jsonify({'error': 'Ingest queue full, retry later'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+def store_rows(rows, stages):
+    """Store parsed rows in one transaction and broadcast them (batch ingest, WebSocket ingest)
+
+    Returns the new ids, or None when the write-behind buffer took the rows
+    (they are broadcast once flushed). Raises queue.Full when it cannot.
+    """
+    if ingest_buffer is not None:
+        ingest_buffer.submit(rows)
+        stages.mark('enqueue')
+        return None
+
+    def write_rows():
+        # One bulk INSERT ... RETURNING, one commit
+        ids = db.session.scalars(
+            insert(DeviceData).returning(DeviceData.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        update_derived_tables(rows)
+        return ids
+
+    ids = run_write(write_rows)
+    stages.mark('commit')
+
+    # Broadcast to SSE clients
+    broadcast_rows(rows)
+    stages.mark('broadcast')
+    return ids
+
+
 @app.route('/api/v1/ingest', methods=['POST'])
 @require_api_key
 def ingest():
     """Receive and store device data"""
     try:
-        data = request.get_json()
-        logger.info(f"📥 Received ingest request: device_id={data.get('device_id')}, ts={data.get('ts')}")
-
-        # Validate required fields
-        required_fields = ['device_id', 'ts']
-        for field in required_fields:
-            if field not in data:
-                logger.warning(f"❌ Missing required field: {field}")
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-
-        # Helper function to safely convert to float
-        def safe_float(value, field_name):
-            if value is None:
-                return None
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                raise ValueError(f"Invalid type for field '{field_name}': cannot convert to float")
+        stages = metrics.StageTimer('ingest')
+        try:
+            data, parse = read_ingest_body()
+            if parse is decoded_reading:  # Binary bodies are a list of readings
+                if len(data) != 1:
+                    raise ValueError('Binary body must hold exactly one reading; send several to /api/v1/ingest/batch')
+                data = data[0]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stages.mark('parse')
+        fields = data if isinstance(data, dict) else {}  # parse rejects anything else below
+        device_id = fields.get('device_id')
+        ingest_logger.info("📥 Received ingest request: device_id=%s, ts=%s", device_id,
+                           fields.get('ts', fields.get('timestamp')), extra={'device_id': device_id})
 
-        # Extract and validate optional float fields
         try:
-            voltage = safe_float(data.get('voltage_v'), 'voltage_v')
-            current = safe_float(data.get('current_a'), 'current_a')
-            pressure_hpa = safe_float(data.get('pressure_hpa'), 'pressure_hpa')
-            temp_c = safe_float(data.get('temp_c'), 'temp_c')
-            humidity_pct = safe_float(data.get('humidity_pct'), 'humidity_pct')
-            wind_mps = safe_float(data.get('wind_mps'), 'wind_mps')
-            wind_voltage_v = safe_float(data.get('wind_voltage_v'), 'wind_voltage_v')
-            solar_voltage_v = safe_float(data.get('solar_voltage_v'), 'solar_voltage_v')
+            values = parse(data)
         except ValueError as e:
-            logger.warning(f"❌ Type validation error: {str(e)}")
+            ingest_logger.warning("❌ Validation error: %s", e, extra={'device_id': device_id})
             return jsonify({'error': str(e)}), 400
+        stages.mark('validate')
 
-        # Extract rpm (integer field)
-        rpm = data.get('rpm')
-        if rpm is not None:
-            try:
-                rpm = int(rpm)
-            except (ValueError, TypeError):
-                logger.warning(f"❌ Invalid type for field 'rpm': cannot convert to int")
-                return jsonify({'error': "Invalid type for field 'rpm': cannot convert to int"}), 400
-
-        # Calculate power: P = V × I
-        power = None
-        if voltage is not None and current is not None:
-            power = voltage * current
-            logger.info(f"⚡ Calculated power: {power:.2f}W (V={voltage}V, I={current}A)")
-
-        # Create device data entry
-        device_data = DeviceData(
-            device_id=data['device_id'],
-            timestamp=from_timestamp_utc(data['ts']),  # Store as UTC
-            voltage_v=voltage,
-            current_a=current,
-            power_w=power,
-            rpm=rpm,
-            pressure_hpa=pressure_hpa,
-            temp_c=temp_c,
-            humidity_pct=humidity_pct,
-            wind_mps=wind_mps,
-            wind_voltage_v=wind_voltage_v,
-            solar_voltage_v=solar_voltage_v
-        )
+        if values['power_w'] is not None:
+            ingest_logger.info("⚡ Calculated power: %.2fW (V=%sV, I=%sA)",
+                               values['power_w'], values['voltage_v'], values['current_a'],
+                               extra={'device_id': device_id})
 
-        db.session.add(device_data)
-        db.session.commit()
+        if ingest_buffer is not None:
+            try:
+                ingest_buffer.submit([values])
+            except Full:
+                ingest_logger.warning("⏳ Ingest queue full: device_id=%s", device_id, extra={'device_id': device_id})
+                return queue_full_response()
+            stages.mark('enqueue')
+            return jsonify({'status': 'queued', 'device_id': values['device_id']}), 202
+
+        def write_reading():
+            # Create device data entry
+            device_data = DeviceData(**values)
+            db.session.add(device_data)
+            update_derived_tables([values])
+            db.session.flush()
+            return device_data.id
 
-        logger.info(f"✅ Data saved to DB: id={device_data.id}, device_id={device_data.device_id}")
+        row_id = run_write(write_reading)
+        stages.mark('commit')
+        ingest_logger.info("✅ Data saved to DB: id=%s, device_id=%s", row_id, device_id,
+                           extra={'device_id': device_id})
 
         # Broadcast to SSE clients
-        broadcast_data = {
-            'device_id': device_data.device_id,
-            'timestamp': to_taiwan_time(device_data.timestamp).isoformat(),
-            'voltage_v': device_data.voltage_v,
-            'current_a': device_data.current_a,
-            'power_w': device_data.power_w,
-            'rpm': device_data.rpm,
-            'pressure_hpa': device_data.pressure_hpa,
-            'temp_c': device_data.temp_c,
-            'humidity_pct': device_data.humidity_pct,
-            'wind_mps': device_data.wind_mps,
-            'wind_voltage_v': device_data.wind_voltage_v,
-            'solar_voltage_v': device_data.solar_voltage_v
-        }
-        broadcast_to_device_clients(device_data.device_id, broadcast_data)
-        logger.info(f"📡 Broadcast to SSE clients: device_id={device_data.device_id}")
+        broadcast_rows([values])
+        stages.mark('broadcast')
+        ingest_logger.info("📡 Broadcast to SSE clients: device_id=%s", device_id, extra={'device_id': device_id})
 
         return jsonify({
             'status': 'success',
-            'id': device_data.id,
-            'device_id': device_data.device_id
+            'id': row_id,
+            'device_id': values['device_id']
         }), 201
 
     except Exception as e:
-        logger.error(f"❌ Error in ingest: {str(e)}")
+        ingest_logger.error("❌ Error in ingest: %s", e)
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/v1/ingest/batch', methods=['POST'])
+@require_api_key
+def ingest_batch():
+    """Receive and store many readings in a single transaction
+
+    Accepts either a JSON array of readings, {"readings": [...]} or a
+    binary body (BINARY_CONTENT_TYPE).
+    Invalid readings are reported per item; valid ones are still stored.
+    """
+    try:
+        stages = metrics.StageTimer('batch')
+        try:
+            data, parse = read_ingest_body()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        stages.mark('parse')
+        readings = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(readings, list):
+            return jsonify({'error': 'Body must be a JSON array or an object with a "readings" array'}), 400
+        if len(readings) > INGEST_BATCH_MAX:
+            return jsonify({'error': f'Batch too large: max {INGEST_BATCH_MAX} readings'}), 413
+
+        results = [None] * len(readings)
+        rows = []
+        row_indexes = []
+        for i, reading in enumerate(readings):
+            try:
+                rows.append(parse(reading))
+                row_indexes.append(i)
+            except ValueError as e:
+                results[i] = {'index': i, 'status': 'error', 'error': str(e)}
+        stages.mark('validate')
+
+        if rows:
+            try:
+                ids = store_rows(rows, stages)
+            except Full:
+                ingest_logger.warning("⏳ Ingest queue full: rejected batch of %d", len(rows))
+                return queue_full_response()
+            if ids is None:
+                for i, row in zip(row_indexes, rows):
+                    results[i] = {'index': i, 'status': 'queued', 'device_id': row['device_id']}
+            else:
+                for i, row, row_id in zip(row_indexes, rows, ids):
+                    results[i] = {'index': i, 'status': 'success', 'id': row_id, 'device_id': row['device_id']}
+
+        accepted = len(rows)
+        rejected = len(readings) - accepted
+        ingest_logger.info("📦 Batch ingest: %d saved, %d rejected", accepted, rejected)
+
+        return jsonify({
+            'status': 'error' if not accepted else ('partial' if rejected else 'success'),
+            'accepted': accepted,
+            'rejected': rejected,
+            'results': results
+        }), (202 if ingest_buffer is not None else 201) if accepted else 400
+
+    except Exception as e:
+        ingest_logger.error("❌ Error in batch ingest: %s", e)
+        db.session.rollback()
+        # Database errors carry SQL and parameters: log them, do not return them
+        return jsonify({'error': 'Failed to store readings'}), 500
+
+
 @app.route('/api/v1/stream')
 def stream():
     """SSE endpoint for real-time data"""
@@ -230,6 +591,8 @@ def stream():
         return jsonify({'error': 'device_id parameter required'}), 400
 
     logger.info(f"🔌 SSE connection opened: device_id={device_id}")
+    # Make sure this worker receives readings ingested by other workers
+    pubsub.start()
 
     def event_stream():
         client_queue = Queue(maxsize=10)
@@ -238,15 +601,15 @@ def stream():
             if device_id not in sse_clients:
                 sse_clients[device_id] = []
             sse_clients[device_id].append(client_queue)
+        metrics.SSE_SUBSCRIBERS.inc()
 
         try:
             # Send initial connection message
-            yield f"data: {json.dumps({'type': 'connected', 'device_id': device_id})}\n\n"
+            yield sse_frame({'type': 'connected', 'device_id': device_id})
 
             while True:
                 try:
-                    data = client_queue.get(timeout=15)  # 15 second timeout
-                    yield f"data: {json.dumps(data)}\n\n"
+                    yield client_queue.get(timeout=15)  # 15 second timeout
                 except Empty:
                     # Send keepalive every 15 seconds to keep connection alive
                     yield f": keepalive {to_taiwan_time(now_utc()).isoformat()}\n\n"
@@ -257,6 +620,7 @@ def stream():
                     sse_clients[device_id].remove(client_queue)
                     if not sse_clients[device_id]:
                         del sse_clients[device_id]
+            metrics.SSE_SUBSCRIBERS.dec()
 
     response = Response(event_stream(), mimetype='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
@@ -267,27 +631,33 @@ def stream():
 
 
 @app.route('/api/v1/devices')
+@cached_response(per_device=False)
 def get_devices():
     """Get list of all devices that have sent data"""
     try:
-        devices = db.session.query(DeviceData.device_id).distinct().all()
+        if latest_cache is not None:
+            ensure_latest_cache()
+        if latest_cache is not None and latest_cache.is_complete():
+            # Served without SQL
+            devices = sorted((device_id, last_seen) for device_id, last_seen, _ in latest_cache.items())
+        else:
+            # One indexed read of the registry maintained by ingest
+            devices = db.session.execute(
+                select(Device.device_id, Device.last_seen).order_by(Device.device_id)
+            ).all()
         device_list = []
 
         logger.info(f"📋 Getting devices list: found {len(devices)} unique device(s)")
 
-        for (device_id,) in devices:
-            # Get latest data for each device
-            latest = DeviceData.query.filter_by(device_id=device_id)\
-                .order_by(DeviceData.timestamp.desc()).first()
-
-            if latest:
-                timestamp_tz = to_taiwan_time(latest.timestamp)
-                offline = (to_taiwan_time(now_utc()) - timestamp_tz).total_seconds() > OFFLINE_THRESHOLD_SECONDS
-                device_list.append({
-                    'device_id': device_id,
-                    'last_seen': timestamp_tz.isoformat(),
-                    'offline': offline
-                })
+        now_tz = to_taiwan_time(now_utc())
+        for device_id, last_seen in devices:
+            timestamp_tz = to_taiwan_time(last_seen)
+            offline = (now_tz - timestamp_tz).total_seconds() > OFFLINE_THRESHOLD_SECONDS
+            device_list.append({
+                'device_id': device_id,
+                'last_seen': timestamp_tz.isoformat(),
+                'offline': offline
+            })
 
         logger.info(f"✅ Returning {len(device_list)} device(s)")
         return jsonify({'devices': device_list})
@@ -297,6 +667,7 @@ def get_devices():
 
 
 @app.route('/api/v1/latest')
+@cached_response()
 def get_latest():
     """Get latest data for a device"""
     device_id = request.args.get('device_id')
@@ -304,37 +675,261 @@ def get_latest():
         return jsonify({'error': 'device_id parameter required'}), 400
 
     try:
-        latest = DeviceData.query.filter_by(device_id=device_id)\
-            .order_by(DeviceData.timestamp.desc()).first()
-
-        if not latest:
-            return jsonify({'error': 'No data found for device'}), 404
-
-        timestamp_tz = to_taiwan_time(latest.timestamp)
+        if latest_cache is not None:
+            ensure_latest_cache()
+            # A miss falls through to the registry: the cache may not have seen this device yet
+            entry = latest_cache.get(device_id)
+        else:
+            entry = None
+
+        if entry is None:
+            latest = db.session.get(Device, device_id)
+            if not latest:
+                return jsonify({'error': 'No data found for device'}), 404
+            entry = (latest.last_seen, {f: getattr(latest, f) for f in METRIC_FIELDS})
+            if latest_cache is not None:
+                latest_cache.put(device_id, *entry)
+
+        last_seen, values = entry
+        timestamp_tz = to_taiwan_time(last_seen)
         offline = (to_taiwan_time(now_utc()) - timestamp_tz).total_seconds() > OFFLINE_THRESHOLD_SECONDS
 
         return jsonify({
-            'device_id': latest.device_id,
+            'device_id': device_id,
             'timestamp': timestamp_tz.isoformat(),
             'offline': offline,
-            'data': {
-                'voltage_v': latest.voltage_v,
-                'current_a': latest.current_a,
-                'power_w': latest.power_w,
-                'rpm': latest.rpm,
-                'pressure_hpa': latest.pressure_hpa,
-                'temp_c': latest.temp_c,
-                'humidity_pct': latest.humidity_pct,
-                'wind_mps': latest.wind_mps,
-                'wind_voltage_v': latest.wind_voltage_v,
-                'solar_voltage_v': latest.solar_voltage_v
-            }
+            'data': dict(values)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', '5000'))
+DOWNSAMPLE_MODES = ['lttb', 'bucket']
+
+
+HISTORY_FORMATS = ['json', 'columnar', 'binary']
+# Binary history layout: magic, uint32 header length, JSON header padded to 8 bytes, column buffers
+BINARY_MAGIC = b'WMH1'
+
+
+def to_float_list(values):
+    """NumPy array to JSON-ready list (NaN becomes null)"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def to_json_list(name, values, integer_columns):
+    """Column to JSON-ready list, keeping integer columns (rpm) as ints"""
+    column = to_float_list(values)
+    if name in integer_columns:
+        column = [None if v is None else int(v) for v in column]
+    return column
+
+
+def fetch_history_columns(device_id, fields, from_ts, to_ts, limit=None):
+    """Fetch the timestamp and metric columns of raw rows as NumPy arrays, oldest first.
+
+    Rows go straight into arrays without building ORM objects or dicts.
+    With `limit`, only the newest `limit` rows are returned.
+    """
+    stmt = select(DeviceData.timestamp, *[getattr(DeviceData, f) for f in fields])\
+        .where(DeviceData.device_id == device_id)
+    if from_ts:
+        stmt = stmt.where(DeviceData.timestamp >= from_timestamp_utc(int(from_ts)))
+    if to_ts:
+        stmt = stmt.where(DeviceData.timestamp <= from_timestamp_utc(int(to_ts)))
+    if limit:
+        rows = db.session.execute(stmt.order_by(DeviceData.timestamp.desc()).limit(limit)).all()
+        rows.reverse()
+    else:
+        rows = db.session.execute(stmt.order_by(DeviceData.timestamp.asc())).all()
+
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(fields) + 1)]
+    # Stored timestamps are naive UTC, which is what datetime64 assumes
+    ts = np.array(columns[0], dtype='datetime64[ms]').astype(np.int64)
+    values = {f: np.array(col, dtype=np.float64) for f, col in zip(fields, columns[1:])}
+    return ts, values
+
+
+def history_entries(ts, series, integer_columns):
+    """Row-oriented history entries (the default JSON format)"""
+    columns = {name: to_json_list(name, values, integer_columns) for name, values in series.items()}
+    history = []
+    for i, ms in enumerate(ts.tolist()):
+        entry = {
+            'timestamp': to_taiwan_time(from_timestamp_utc(ms)).isoformat(),
+            'ts': ms
+        }
+        for name, column in columns.items():
+            entry[name] = column[i]
+        history.append(entry)
+    return history
+
+
+def history_response(device_id, history_format, ts, series, integer_columns, extra=None):
+    """Build a columnar JSON or binary history response from NumPy columns"""
+    extra = extra or {}
+    if history_format == 'columnar':
+        columns = {'ts': ts.tolist()}
+        for name, values in series.items():
+            columns[name] = to_json_list(name, values, integer_columns)
+        return jsonify({'device_id': device_id, 'count': len(ts), 'format': 'columnar',
+                        'columns': columns, **extra})
+
+    # Little-endian int64 timestamps, then one float32 buffer per metric (NaN = null)
+    header = json.dumps({
+        'device_id': device_id,
+        'count': len(ts),
+        'columns': [{'name': 'ts', 'dtype': '<i8'}] + [{'name': name, 'dtype': '<f4'} for name in series],
+        **extra
+    }).encode('utf-8')
+    header += b' ' * (-(len(BINARY_MAGIC) + 4 + len(header)) % 8)
+    buffers = [ts.astype('<i8').tobytes()] + [values.astype('<f4').tobytes() for values in series.values()]
+    body = b''.join([BINARY_MAGIC, struct.pack('<I', len(header)), header] + buffers)
+    return Response(body, mimetype='application/octet-stream')
+
+
+def history_points(start_ms, end_ms, points, resolution):
+    """Number of output points for a range, from points= or resolution= (seconds)"""
+    if resolution:
+        points = int(np.ceil((end_ms - start_ms) / (resolution * 1000))) or 1
+    return max(1, min(points, HISTORY_MAX_POINTS))
+
+
+def fetch_rollups(device_id, fields, resolution, lo_ms, hi_ms):
+    """Load the rollup buckets of one resolution starting in [lo_ms, hi_ms) as NumPy arrays"""
+    columns = []
+    for f in fields:
+        columns += [getattr(DeviceRollup, f'{f}_{stat}') for stat in ROLLUP_STATS]
+    stmt = select(DeviceRollup.bucket, *columns).where(
+        DeviceRollup.device_id == device_id,
+        DeviceRollup.resolution == resolution,
+        DeviceRollup.bucket >= from_timestamp_utc(lo_ms),
+        DeviceRollup.bucket < from_timestamp_utc(hi_ms)
+    ).order_by(DeviceRollup.bucket.asc())
+    rows = db.session.execute(stmt).all()
+
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(fields) * len(ROLLUP_STATS) + 1)]
+    ts = np.array(columns[0], dtype='datetime64[ms]').astype(np.int64)
+    partials = {}
+    for i, f in enumerate(fields):
+        offset = 1 + i * len(ROLLUP_STATS)
+        partials[f] = {
+            stat: np.array(columns[offset + j], dtype=np.int64 if stat == 'count' else np.float64)
+            for j, stat in enumerate(ROLLUP_STATS)
+        }
+    return ts, partials, len(rows)
+
+
+def fetch_raw_partials(device_id, fields, lo_ms, hi_ms):
+    """Raw rows in [lo_ms, hi_ms) shaped like rollup partials (one reading per row)"""
+    stmt = select(DeviceData.timestamp, *[getattr(DeviceData, f) for f in fields]).where(
+        DeviceData.device_id == device_id,
+        DeviceData.timestamp >= from_timestamp_utc(lo_ms),
+        DeviceData.timestamp < from_timestamp_utc(hi_ms)
+    ).order_by(DeviceData.timestamp.asc())
+    rows = db.session.execute(stmt).all()
+
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(fields) + 1)]
+    ts = np.array(columns[0], dtype='datetime64[ms]').astype(np.int64)
+    partials = {}
+    for f, column in zip(fields, columns[1:]):
+        values = np.array(column, dtype=np.float64)
+        present = np.isfinite(values)
+        values[~present] = np.nan
+        partials[f] = {
+            'count': present.astype(np.int64),
+            'min': values,
+            'max': values,
+            'sum': np.where(present, values, 0.0),
+        }
+    return ts, partials, len(rows)
+
+
+def fetch_range_partials(device_id, fields, resolution, lo_ms, hi_ms):
+    """Partials covering exactly [lo_ms, hi_ms), coarsest resolution first.
+
+    Only buckets that lie wholly inside the range are read at `resolution`;
+    the partial buckets at either edge come from the next finer rollup and,
+    below the finest one, from raw rows.
+    """
+    if resolution is None:
+        return fetch_raw_partials(device_id, fields, lo_ms, hi_ms)
+    finer = max((r for r in ROLLUP_RESOLUTIONS if r < resolution), default=None)
+    step = resolution * 1000
+    first = -(-lo_ms // step) * step
+    stop = hi_ms // step * step
+    if first >= stop:
+        return fetch_range_partials(device_id, fields, finer, lo_ms, hi_ms)
+
+    pieces = [fetch_rollups(device_id, fields, resolution, first, stop)]
+    if lo_ms < first:
+        pieces.append(fetch_range_partials(device_id, fields, finer, lo_ms, first))
+    if stop < hi_ms:
+        pieces.append(fetch_range_partials(device_id, fields, finer, stop, hi_ms))
+    if len(pieces) == 1:
+        return pieces[0]
+
+    ts = np.concatenate([piece[0] for piece in pieces])
+    order = np.argsort(ts, kind='stable')
+    partials = {
+        f: {stat: np.concatenate([piece[1][f][stat] for piece in pieces])[order] for stat in ROLLUP_STATS}
+        for f in fields
+    }
+    return ts[order], partials, sum(piece[2] for piece in pieces)
+
+
+def downsampled_history(device_id, fields, from_ts, to_ts, points, resolution, mode):
+    """Downsample the full [from, to] range of a device to at most `points` entries.
+
+    Bucket mode over an explicit range reads the coarsest rollup that still
+    fits in one output bucket, with the edges filled in exactly from finer data. Otherwise only the timestamp and requested
+    metric columns are fetched from raw data, straight into NumPy arrays
+    without building ORM objects.
+    """
+    rollup_resolution = None
+    if mode == 'bucket' and ROLLUPS_ENABLED and from_ts and to_ts:
+        start_ms, end_ms = int(from_ts), int(to_ts)
+        points = history_points(start_ms, end_ms, points, resolution)
+        rollup_resolution = pick_resolution((end_ms - start_ms) / 1000 / points)
+
+    if rollup_resolution:
+        # to is inclusive, the rollup ranges are half-open
+        ts, partials, source_count = fetch_range_partials(device_id, fields, rollup_resolution, start_ms, end_ms + 1)
+        source = f'rollup_{rollup_resolution}s'
+    else:
+        ts, values = fetch_history_columns(device_id, fields, from_ts, to_ts)
+        source_count = len(ts)
+        source = 'raw'
+
+        start_ms = int(from_ts) if from_ts else (int(ts[0]) if len(ts) else 0)
+        end_ms = int(to_ts) if to_ts else (int(ts[-1]) if len(ts) else 0)
+        points = history_points(start_ms, end_ms, points, resolution)
+
+    if mode == 'bucket':
+        if rollup_resolution:
+            out_ts, stats = bucket_combine(ts, partials, points, start_ms, end_ms)
+        else:
+            out_ts, stats = bucket_aggregate(ts, values, points, start_ms, end_ms)
+        series = {}
+        for f in fields:
+            series[f] = stats[f]['avg']
+            series[f + '_min'] = stats[f]['min']
+            series[f + '_max'] = stats[f]['max']
+        integer_columns = set()
+    else:
+        # LTTB keeps real rows, chosen by the requested metric (or the first one with data)
+        key = next((f for f in fields if not np.isnan(values[f]).all()), fields[0])
+        indexes = lttb_indices(ts, values[key], points) if len(ts) else np.array([], dtype=np.int64)
+        series = {f: values[f][indexes] for f in fields}
+        out_ts = ts[indexes]
+        integer_columns = {'rpm'}
+
+    return out_ts, series, integer_columns, {'source': source, 'source_count': source_count, 'points': points}
+
+
 @app.route('/api/v1/history')
+@cached_response()
 def get_history():
     """Get historical data for a device"""
     device_id = request.args.get('device_id')
@@ -342,11 +937,48 @@ def get_history():
     from_ts = request.args.get('from')
     to_ts = request.args.get('to')
     limit = request.args.get('limit', 1000, type=int)
+    points = request.args.get('points', type=int)
+    resolution = request.args.get('resolution', type=float)
+    mode = request.args.get('mode', 'lttb')
+    history_format = request.args.get('format', 'json')
 
     if not device_id:
         return jsonify({'error': 'device_id parameter required'}), 400
+    if history_format not in HISTORY_FORMATS:
+        return jsonify({'error': f"Invalid format: must be one of {', '.join(HISTORY_FORMATS)}"}), 400
 
     try:
+        if points or resolution:
+            # Downsample the whole range instead of truncating to the newest rows
+            if mode not in DOWNSAMPLE_MODES:
+                return jsonify({'error': f"Invalid mode: must be one of {', '.join(DOWNSAMPLE_MODES)}"}), 400
+            if metric and metric not in METRIC_FIELDS:
+                return jsonify({'error': f'Unknown metric: {metric}'}), 400
+            if (points is not None and points < 1) or (resolution is not None and resolution <= 0):
+                return jsonify({'error': 'points and resolution must be positive'}), 400
+
+            fields = [metric] if metric else METRIC_FIELDS
+            ts, series, integer_columns, info = downsampled_history(
+                device_id, fields, from_ts, to_ts, points, resolution, mode)
+            if history_format != 'json':
+                return history_response(device_id, history_format, ts, series, integer_columns,
+                                        {'downsample': {'mode': mode, **info}})
+            history = history_entries(ts, series, integer_columns)
+            return jsonify({
+                'device_id': device_id,
+                'count': len(history),
+                'history': history,
+                'downsample': {'mode': mode, **info}
+            })
+
+        if history_format != 'json':
+            # Columnar formats are built from column arrays, never per-row dicts
+            if metric and metric not in METRIC_FIELDS:
+                return jsonify({'error': f'Unknown metric: {metric}'}), 400
+            fields = [metric] if metric else METRIC_FIELDS
+            ts, values = fetch_history_columns(device_id, fields, from_ts, to_ts, limit)
+            return history_response(device_id, history_format, ts, values, {'rpm'})
+
         query = DeviceData.query.filter_by(device_id=device_id)
 
         if from_ts:
@@ -396,10 +1028,97 @@ def get_history():
         return jsonify({'error': str(e)}), 500
 
 
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+@app.route('/api/v1/export')
+def export_history():
+    """Stream historical data as NDJSON or CSV with constant memory use
+
+    Same filters as /api/v1/history but no limit: rows are read through a
+    server-side cursor and sent in chunks as they arrive.
+    """
+    device_id = request.args.get('device_id')
+    metric = request.args.get('metric')
+    from_ts = request.args.get('from')
+    to_ts = request.args.get('to')
+    export_format = request.args.get('format', 'ndjson')
+
+    if not device_id:
+        return jsonify({'error': 'device_id parameter required'}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Invalid format: must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if metric and metric not in METRIC_FIELDS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+
+    fields = [metric] if metric else METRIC_FIELDS
+    stmt = select(DeviceData.timestamp, *[getattr(DeviceData, f) for f in fields])\
+        .where(DeviceData.device_id == device_id)
+    try:
+        if from_ts:
+            stmt = stmt.where(DeviceData.timestamp >= from_timestamp_utc(int(from_ts)))
+        if to_ts:
+            stmt = stmt.where(DeviceData.timestamp <= from_timestamp_utc(int(to_ts)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    stmt = stmt.order_by(DeviceData.timestamp.asc()).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    def generate():
+        columns = ['timestamp', 'ts'] + fields
+        if export_format == 'csv':
+            yield ','.join(columns) + '\n'
+
+        count = 0
+        result = db.session.execute(stmt)
+        try:
+            for rows in result.partitions():
+                buffer = io.StringIO()
+                writer = csv.writer(buffer) if export_format == 'csv' else None
+                for row in rows:
+                    timestamp_tz = to_taiwan_time(row[0])
+                    values = [timestamp_tz.isoformat(), int(timestamp_tz.timestamp() * 1000), *row[1:]]
+                    if writer is not None:
+                        writer.writerow(values)
+                    else:
+                        buffer.write(json.dumps(dict(zip(columns, values))))
+                        buffer.write('\n')
+                count += len(rows)
+                yield buffer.getvalue()
+        finally:
+            result.close()
+            logger.info(f"📤 Exported {count} rows: device_id={device_id}, format={export_format}")
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{device_id}.{export_format}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/v1/health')
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': to_taiwan_time(now_utc()).isoformat()})
+    health_data = {'status': 'healthy', 'timestamp': to_taiwan_time(now_utc()).isoformat()}
+    if ingest_buffer is not None:
+        health_data['ingest_buffer'] = ingest_buffer.stats()
+    if latest_cache is not None:
+        health_data['latest_cache'] = latest_cache.stats()
+    if response_cache is not None:
+        health_data['response_cache'] = response_cache.stats()
+    if retention_job is not None:
+        health_data['retention'] = retention_job.stats()
+    if sqlite_writer is not None:
+        health_data['sqlite_writer'] = sqlite_writer.stats()
+    if log_handler is not None:
+        health_data['logging'] = {'mode': LOG_MODE, 'dropped': log_handler.dropped}
+    return jsonify(health_data)
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus metrics of all workers"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 
 # Development endpoints
@@ -412,38 +1131,23 @@ def simulate_data():
 
         logger.info(f"🧪 Simulating {count} data points for device {device_id}")
 
+        interval_s = float(request.json.get('interval_s', 60)) if request.json else 60
+        seed = request.json.get('seed') if request.json else None
+
         now = now_utc()  # Use UTC for database storage
-        created = []
-
-        for i in range(count):
-            timestamp = now - timedelta(minutes=count - i)
-
-            # Generate sensor data
-            voltage = round(12 + random.uniform(-1, 1), 2)
-            current = round(1.2 + random.uniform(-0.2, 0.3), 2)
-            power = voltage * current  # Calculate power
-            wind_voltage = round(5 + random.uniform(-0.5, 0.5), 2)
-            solar_voltage = round(18 + random.uniform(-1, 1), 2)
-
-            device_data = DeviceData(
-                device_id=device_id,
-                timestamp=timestamp,
-                voltage_v=voltage,
-                current_a=current,
-                power_w=power,
-                rpm=int(3400 + random.uniform(-200, 300)),
-                pressure_hpa=round(1013 + random.uniform(-5, 5), 2),
-                temp_c=round(25 + random.uniform(-3, 3), 1),
-                humidity_pct=round(55 + random.uniform(-10, 10), 1),
-                wind_mps=round(3.5 + random.uniform(-1, 1.5), 1),
-                wind_voltage_v=wind_voltage,
-                solar_voltage_v=solar_voltage
-            )
+        # One reading per interval ending now; no offline gaps so exactly `count` rows are created
+        (_, timestamps, columns), = datagen.generate(
+            [device_id], now - timedelta(seconds=count * interval_s), now, interval_s, seed, gaps_per_day=0
+        )
+        rows = next(datagen.to_rows(device_id, timestamps, columns), [])
 
-            db.session.add(device_data)
-            created.append(device_data.id)
+        def write_simulated():
+            if rows:
+                db.session.execute(insert(DeviceData), rows)
+                update_derived_tables(rows)
 
-        db.session.commit()
+        run_write(write_simulated)
+        cache_rows(rows)
         logger.info(f"✅ Simulated {count} data points")
 
         return jsonify({
@@ -463,9 +1167,17 @@ def simulate_data():
 def clear_data():
     """Development only: Clear all device data"""
     try:
-        count = db.session.query(DeviceData).count()
-        db.session.query(DeviceData).delete()
-        db.session.commit()
+        def delete_all():
+            db.session.query(DeviceRollup).delete()
+            db.session.query(Device).delete()
+            # Single pass: the DELETE reports how many rows it removed
+            return db.session.query(DeviceData).delete(synchronize_session=False)
+
+        count = run_write(delete_all)
+        if latest_cache is not None:
+            latest_cache.clear()
+        if response_cache is not None:
+            response_cache.invalidate()
 
         logger.info(f"🗑️ Cleared {count} data points")
 
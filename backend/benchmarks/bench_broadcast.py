@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+SSE broadcast benchmark: per-reading fan-out cost vs. subscriber count.
+
+Compares serializing the reading once per subscriber (the old path, where
+each event_stream() ran json.dumps) with encoding the frame once and sharing
+the bytes across all subscriber queues.
+
+Usage:
+    cd backend
+    python benchmarks/bench_broadcast.py
+"""
+import os
+import sys
+import json
+import time
+from queue import Queue
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logging
+logging.disable(logging.INFO)
+
+import app as backend  # noqa: E402
+
+DEVICE_ID = 'bench-001'
+READINGS = 200
+SUBSCRIBER_COUNTS = [1, 10, 100, 1000]
+
+READING = {
+    'device_id': DEVICE_ID,
+    'timestamp': '2025-01-01T08:00:00+08:00',
+    'voltage_v': 12.34, 'current_a': 1.23, 'power_w': 15.1782, 'rpm': 3450,
+    'pressure_hpa': 1013.25, 'temp_c': 25.6, 'humidity_pct': 55.2, 'wind_mps': 3.4,
+    'wind_voltage_v': 5.1, 'solar_voltage_v': 18.2
+}
+
+
+def per_subscriber_serialization(queues):
+    """Old path: queue the dict, every subscriber generator serializes it"""
+    for _ in range(READINGS):
+        for q in queues:
+            q.put_nowait(READING)
+        for q in queues:
+            f"data: {json.dumps(q.get_nowait())}\n\n".encode('utf-8')
+
+
+def shared_frame(queues):
+    """New path: broadcast_to_device_clients() encodes once, subscribers yield the bytes"""
+    for _ in range(READINGS):
+        backend.broadcast_to_device_clients(DEVICE_ID, READING)
+        for q in queues:
+            q.get_nowait()
+
+
+def measure(fn, queues):
+    start = time.perf_counter()
+    fn(queues)
+    return (time.perf_counter() - start) / READINGS * 1e6
+
+
+def main():
+    print(f"{'subscribers':>12} {'per-subscriber (µs)':>20} {'shared frame (µs)':>18} {'speedup':>8}")
+    for count in SUBSCRIBER_COUNTS:
+        queues = [Queue(maxsize=10) for _ in range(count)]
+        with backend.clients_lock:
+            backend.sse_clients[DEVICE_ID] = queues
+        old = measure(per_subscriber_serialization, queues)
+        new = measure(shared_frame, queues)
+        print(f"{count:>12} {old:>20.1f} {new:>18.1f} {old / new:>7.1f}x")
+    with backend.clients_lock:
+        backend.sse_clients.pop(DEVICE_ID, None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Logging overhead on the ingest path: the same ingest load with every log
+mode, each in a fresh process with its log output going to a file.
+
+Modes:
+    text                   current behaviour: every line formatted and written on the request thread
+    structured             JSON lines via QueueHandler/QueueListener, sampled per device (10 s)
+    structured, unsampled  JSON via the queue, every line (isolates the queue from the sampling)
+    WARNING only           no per-request logs at all (the floor)
+
+Uses an in-memory SQLite database so logging is a visible share of request time.
+"log us/req" times the four log calls of one ingest request on their own, as
+the request thread pays for them.
+
+Usage:
+    cd backend
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --requests 5000 --devices 500 --threads 8
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_ROUNDS = 2000  # Requests' worth of log calls timed in isolation (stays below the queue bound)
+
+MODES = [
+    ('text', {'LOG_MODE': 'text'}),
+    ('structured', {'LOG_MODE': 'structured', 'LOG_SAMPLE_INTERVAL_S': '10'}),
+    ('structured, unsampled', {'LOG_MODE': 'structured', 'LOG_SAMPLE_INTERVAL_S': '0'}),
+    ('WARNING only', {'LOG_MODE': 'text', 'LOG_LEVEL': 'WARNING'}),
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def worker(env, log_path, requests, devices, threads, results):
+    """One mode in a fresh process: logging is configured when app is imported"""
+    os.environ.update(env)
+    # Send the process's log output (stderr) to the file, like a redirected gunicorn log
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    os.dup2(log_fd, 2)
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    client = app.test_client()
+    headers = {'x-api-key': env['API_KEY']}
+    latencies = []
+    lock = threading.Lock()
+
+    def post(thread_index, count):
+        rng = random.Random(thread_index)
+        local = []
+        for i in range(count):
+            payload = {
+                'device_id': f"bench-{rng.randrange(devices):04d}",
+                'ts': int(time.time() * 1000),
+                'voltage_v': round(12 + rng.random(), 2),
+                'current_a': round(1 + rng.random(), 2),
+                'rpm': 3000,
+            }
+            started = time.perf_counter()
+            response = client.post('/api/v1/ingest', headers=headers, json=payload)
+            local.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 201, response.status_code
+        with lock:
+            latencies.extend(local)
+
+    # Warm up outside the measurement
+    post(-1, 50)
+    latencies.clear()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=post, args=(i, requests // threads)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    # The log calls of one ingest request alone, as seen by the request thread
+    import logging
+    ingest_logger = logging.getLogger('app.ingest')
+    log_started = time.perf_counter()
+    for i in range(LOG_ROUNDS):
+        device_id = f"bench-{i % devices:04d}"
+        extra = {'device_id': device_id}
+        ingest_logger.info("📥 Received ingest request: device_id=%s, ts=%s", device_id, 1792217869631, extra=extra)
+        ingest_logger.info("⚡ Calculated power: %.2fW (V=%sV, I=%sA)", 14.52, 12.1, 1.2, extra=extra)
+        ingest_logger.info("✅ Data saved to DB: id=%s, device_id=%s", i, device_id, extra=extra)
+        ingest_logger.info("📡 Broadcast to SSE clients: device_id=%s", device_id, extra=extra)
+    log_us = (time.perf_counter() - log_started) / LOG_ROUNDS * 1e6
+
+    results.put({'count': len(latencies), 'elapsed': elapsed, 'log_us': log_us,
+                 'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest throughput per logging mode')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=1, help='Concurrent request threads')
+    parser.add_argument('--rounds', type=int, default=3, help='Runs per mode (interleaved); the best is reported')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{args.requests} ingest requests, {args.devices} devices, {args.threads} thread(s), "
+          f"best of {args.rounds}\n")
+    best = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for _ in range(args.rounds):
+            for label, mode_env in MODES:
+                env = {'API_KEY': 'bench-key', 'DATABASE_URL': 'sqlite://', 'RESPONSE_CACHE_TTL': '0', **mode_env}
+                log_path = os.path.join(tmpdir, 'log.txt')
+                results = ctx.Queue()
+                process = ctx.Process(target=worker, args=(env, log_path, args.requests, args.devices,
+                                                           args.threads, results))
+                process.start()
+                result = results.get()
+                process.join()
+                # Count after exit: the structured listener flushes its queue at shutdown
+                with open(log_path, 'rb') as f:
+                    result['lines'] = sum(1 for _ in f)
+                result['rate'] = result['count'] / result['elapsed']
+                if label not in best or result['rate'] > best[label]['rate']:
+                    best[label] = result
+
+    print(f"{'mode':<24}{'readings/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'log lines':>12}{'log us/req':>12}")
+    baseline = best[MODES[0][0]]['rate']
+    for label, _ in MODES:
+        result = best[label]
+        print(f"{label:<24}{result['rate']:>12,.0f}{result['p50']:>10.2f}{result['p99']:>10.2f}"
+              f"{result['lines']:>12,}{result['log_us']:>12.1f}   ({result['rate'] / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
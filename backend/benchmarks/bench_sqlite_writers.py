@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Multi-writer SQLite load test: several worker processes, each with many
+threads posting /api/v1/ingest while readers poll /api/v1/history, like
+gunicorn's 4 workers x 8 threads.
+
+Runs twice against a fresh database file: in the old rollback-journal mode
+(SQLITE_WAL=false) and in production mode (WAL, pragmas, single writer
+thread per process). Prints write throughput, failed writes ("database is
+locked" surfaces as 500) and read latency for each run.
+
+Usage:
+    cd backend
+    python benchmarks/bench_sqlite_writers.py
+    python benchmarks/bench_sqlite_writers.py --processes 4 --threads 8 --writes 200
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def worker(env, threads, writes, readers, start_event, results):
+    """One worker process: `threads` writer threads and `readers` reader threads"""
+    os.environ.update(env)
+    sys.path.insert(0, BACKEND_DIR)
+    logging.disable(logging.CRITICAL)
+    from app import app
+    client = app.test_client()
+    headers = {'x-api-key': env['API_KEY']}
+    lock = threading.Lock()
+    stats = {'ok': 0, 'failed': 0, 'read_ms': [], 'errors': {}}
+    writing = threading.Event()
+    writing.set()
+
+    def write(thread_index):
+        rng = random.Random(thread_index)
+        device_id = f"bench-{os.getpid()}-{thread_index % 4}"
+        for _ in range(writes):
+            response = client.post('/api/v1/ingest', headers=headers, json={
+                'device_id': device_id,
+                'ts': int(time.time() * 1000),
+                'voltage_v': 12 + rng.random(),
+                'current_a': 1 + rng.random(),
+                'rpm': 3000,
+            })
+            with lock:
+                if response.status_code == 201:
+                    stats['ok'] += 1
+                else:
+                    stats['failed'] += 1
+                    error = (response.get_json(silent=True) or {}).get('error', str(response.status_code))
+                    error = 'database is locked' if 'database is locked' in error else error.split('\n')[0]
+                    stats['errors'][error] = stats['errors'].get(error, 0) + 1
+
+    def read():
+        device_id = f"bench-{os.getpid()}-0"
+        while writing.is_set():
+            started = time.perf_counter()
+            client.get(f'/api/v1/history?device_id={device_id}&limit=200')
+            with lock:
+                stats['read_ms'].append((time.perf_counter() - started) * 1000)
+
+    start_event.wait()
+    started = time.perf_counter()
+    writers = [threading.Thread(target=write, args=(i,)) for i in range(threads)]
+    reader_threads = [threading.Thread(target=read) for _ in range(readers)]
+    for t in writers + reader_threads:
+        t.start()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    writing.clear()
+    for t in reader_threads:
+        t.join()
+    results.put({**stats, 'elapsed': elapsed})
+
+
+def run_mode(label, env, args):
+    ctx = multiprocessing.get_context('spawn')
+    start_event = ctx.Event()
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(env, args.threads, args.writes, args.readers, start_event, results))
+        for _ in range(args.processes)
+    ]
+    for p in processes:
+        p.start()
+    # Let every worker import the app and create tables before the clock starts
+    time.sleep(args.warmup)
+    start_event.set()
+    runs = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+
+    ok = sum(r['ok'] for r in runs)
+    failed = sum(r['failed'] for r in runs)
+    elapsed = max(r['elapsed'] for r in runs)
+    read_ms = [ms for r in runs for ms in r['read_ms']]
+    errors = {}
+    for r in runs:
+        for error, count in r['errors'].items():
+            errors[error] = errors.get(error, 0) + count
+    print(f"\n== {label} ==")
+    print(f"  writes ok      {ok:>8}")
+    print(f"  writes failed  {failed:>8}")
+    print(f"  writes/s       {ok / elapsed:>8.0f}")
+    print(f"  reads          {len(read_ms):>8}  p50 {percentile(read_ms, 50):.1f} ms  "
+          f"p99 {percentile(read_ms, 99):.1f} ms")
+    for error, count in sorted(errors.items(), key=lambda item: -item[1])[:3]:
+        print(f"  {count:>6} x {error[:100]}")
+    return {'ok': ok, 'failed': failed, 'writes_per_s': ok / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Writer threads per process')
+    parser.add_argument('--readers', type=int, default=2, help='Reader threads per process')
+    parser.add_argument('--writes', type=int, default=100, help='Ingest requests per writer thread')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to wait for workers to start')
+    parser.add_argument('--busy-timeout', type=float, default=1.0,
+                        help='Seconds a legacy-mode connection waits for a lock before failing')
+    args = parser.parse_args()
+
+    base_env = {
+        'API_KEY': 'bench-key',
+        'RESPONSE_CACHE_TTL': '0',
+        'LATEST_CACHE': 'false',
+    }
+    summary = {}
+    for label, env in [
+        ('rollback journal (SQLITE_WAL=false)', {'SQLITE_WAL': 'false'}),
+        ('WAL + single writer', {'SQLITE_WAL': 'true', 'SQLITE_SINGLE_WRITER': 'true',
+                                 'SQLITE_BUSY_TIMEOUT_MS': str(int(args.busy_timeout * 1000))}),
+    ]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+            # Legacy mode: pysqlite's default lock timeout, bounded by --busy-timeout
+            url_env = {'DATABASE_URL': url + (f"?timeout={args.busy_timeout}" if env['SQLITE_WAL'] == 'false' else '')}
+            # Create the schema once so workers do not race on create_all
+            init = multiprocessing.get_context('spawn').Process(target=create_schema, args=({**base_env, **env, **url_env},))
+            init.start()
+            init.join()
+            summary[label] = run_mode(label, {**base_env, **env, **url_env}, args)
+
+    legacy, tuned = summary.values()
+    print(f"\n✅ Failed writes {legacy['failed']} -> {tuned['failed']}, "
+          f"throughput {legacy['writes_per_s']:.0f} -> {tuned['writes_per_s']:.0f} writes/s")
+
+
+def create_schema(env):
+    os.environ.update(env)
+    sys.path.insert(0, BACKEND_DIR)
+    logging.disable(logging.CRITICAL)
+    import app  # noqa: F401  (creates the tables on import)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Decode + validate cost per ingest reading, without Flask or a database.
+
+Compares the previous hand-written parse_reading (loop over fields with
+float()/int() on every value) on the stdlib json decoder against the
+table-driven schema in ingest_schema.py, with json and, when installed,
+orjson, and against the binary ingest format.
+Single readings are decoded one JSON object at a time as /ingest does;
+batches are decoded as one array as /ingest/batch does.
+
+Usage:
+    cd backend
+    python benchmarks/bench_validation.py
+    python benchmarks/bench_validation.py --batch 1000 --readings 50000
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest_schema
+from ingest_schema import READING_SCHEMA, FLOAT_FIELDS, BINARY_LAYOUTS, decode_binary
+
+
+def legacy_parse_reading(data):
+    """parse_reading as it was before the schema, for comparison"""
+    if not isinstance(data, dict):
+        raise ValueError('Reading must be a JSON object')
+    for field in ['device_id', 'ts']:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+    try:
+        timestamp = datetime.utcfromtimestamp(float(data['ts']) / 1000.0)
+    except (ValueError, TypeError, OverflowError, OSError):
+        raise ValueError("Invalid type for field 'ts': expected milliseconds since epoch")
+    values = {'device_id': data['device_id'], 'timestamp': timestamp}
+    for field in FLOAT_FIELDS:
+        value = data.get(field)
+        if value is not None:
+            try:
+                value = float(value)
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid type for field '{field}': cannot convert to float")
+        values[field] = value
+    rpm = data.get('rpm')
+    if rpm is not None:
+        try:
+            rpm = int(rpm)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid type for field 'rpm': cannot convert to int")
+    values['rpm'] = rpm
+    voltage, current = values['voltage_v'], values['current_a']
+    values['power_w'] = voltage * current if voltage is not None and current is not None else None
+    return values
+
+
+def make_readings(count, rng):
+    """Payloads like the ESP32 firmware sends: every sensor field present"""
+    ts = int(time.time() * 1000)
+    return [{
+        'device_id': f"esp32-{rng.randrange(100):03d}",
+        'ts': ts + i * 1000,
+        'voltage_v': round(rng.uniform(11, 14), 2),
+        'current_a': round(rng.uniform(0, 3), 2),
+        'rpm': rng.randrange(0, 4000),
+        'pressure_hpa': round(rng.uniform(990, 1030), 1),
+        'temp_c': round(rng.uniform(15, 35), 1),
+        'humidity_pct': round(rng.uniform(40, 95), 1),
+        'wind_mps': round(rng.uniform(0, 15), 2),
+        'wind_voltage_v': round(rng.uniform(0, 24), 2),
+        'solar_voltage_v': round(rng.uniform(0, 20), 2),
+    } for i in range(count)]
+
+
+def measure(fn):
+    """Wall time of one run, with the cyclic GC off like timeit"""
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest payload decode + validate cost per reading')
+    parser.add_argument('--readings', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500, help='Readings per /ingest/batch body')
+    parser.add_argument('--rounds', type=int, default=5, help='Runs per variant (interleaved); the best is reported')
+    args = parser.parse_args()
+
+    readings = make_readings(args.readings, random.Random(42))
+    singles = [json.dumps(r).encode() for r in readings]
+    batches = [json.dumps(readings[i:i + args.batch]).encode() for i in range(0, len(readings), args.batch)]
+
+    decoders = [('json', json.loads)]
+    if ingest_schema.orjson is not None:
+        decoders.append(('orjson', ingest_schema.orjson.loads))
+    # (label, decoder, single bodies, batch bodies, body -> reading, body -> readings, parse)
+    variants = [('legacy parse_reading', 'json', singles, batches, json.loads, json.loads, legacy_parse_reading)]
+    variants += [('schema', name, singles, batches, loads, loads, READING_SCHEMA.parse)
+                 for name, loads in decoders]
+    # The binary format decodes straight to column values: there is no separate validation step
+    layout = BINARY_LAYOUTS[max(BINARY_LAYOUTS)]
+    variants.append((f'binary v{layout.version}', 'struct',
+                     [layout.encode(r['device_id'], [r]) for r in readings],
+                     [layout.encode(readings[i]['device_id'], readings[i:i + args.batch])
+                      for i in range(0, len(readings), args.batch)],
+                     lambda body: decode_binary(body)[0], decode_binary, None))
+
+    print(f"{args.readings:,} readings, batches of {args.batch}, best of {args.rounds}"
+          f"{'' if ingest_schema.orjson is not None else ' (orjson not installed)'}\n")
+    print(f"{'variant':<22}{'decoder':<9}{'validate':>10}{'single':>10}{'batch':>10}{'bytes':>8}"
+          f"   ns per reading; bytes per single body")
+    # Rounds are interleaved across variants so drift on a busy machine affects all of them alike
+    best = {}
+    for _ in range(args.rounds):
+        for label, decoder, single_bodies, batch_bodies, read_single, read_batch, parse in variants:
+            if parse is None:
+                validate = float('nan')
+                parse = lambda reading: reading
+            else:
+                decoded = [read_single(body) for body in single_bodies]
+                validate = measure(lambda: [parse(d) for d in decoded])
+            times = (validate,
+                     measure(lambda: [parse(read_single(body)) for body in single_bodies]),
+                     measure(lambda: [parse(d) for body in batch_bodies for d in read_batch(body)]))
+            previous = best.get((label, decoder), times)
+            best[label, decoder] = tuple(map(min, previous, times))
+
+    baseline = None
+    for label, decoder, single_bodies, _, _, _, _ in variants:
+        per = [t / args.readings * 1e9 for t in best[label, decoder]]
+        size = sum(map(len, single_bodies)) / len(single_bodies)
+        baseline = baseline or per
+        validate = '-' if per[0] != per[0] else f'{per[0]:,.0f}'
+        print(f"{label:<22}{decoder:<9}{validate:>10}{per[1]:>10,.0f}{per[2]:>10,.0f}{size:>8,.0f}"
+              f"   ({baseline[1] / per[1]:.2f}x single, {baseline[2] / per[2]:.2f}x batch)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Bulk loader: stream CSV or NDJSON readings into device_data, e.g. to migrate
+historical logs or replay a device's buffered SD-card data.
+
+Every row is validated by the same schema as /api/v1/ingest (ingest_schema.py:
+same fields, same power_w).
+Valid rows are written in large chunks: COPY FROM STDIN on PostgreSQL,
+executemany on SQLite. The device registry and rollups are updated in the
+same transaction as each chunk.
+
+Usage:
+    cd backend
+    python bulk_load.py readings.csv
+    python bulk_load.py sdcard.ndjson --device esp32-001   # rows without device_id
+    gunzip -c logs.ndjson.gz | python bulk_load.py - --format ndjson
+
+CSV files need a header row with the ingest field names (device_id, ts,
+voltage_v, ...). Empty cells are treated as missing values.
+"""
+import io
+import sys
+import csv
+import time
+import argparse
+from datetime import datetime
+from ingest_schema import READING_SCHEMA, METRIC_FIELDS, loads
+
+FORMATS = ['csv', 'ndjson']
+
+
+def read_records(stream, input_format):
+    """Yield (line number, reading dict or parse error) from a CSV or NDJSON stream"""
+    if input_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, {k: v for k, v in record.items() if v not in ('', None)}
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'Invalid JSON: {e}')
+
+
+def detect_format(path):
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return None
+
+
+def copy_rows(dbapi_connection, dialect_name, columns, rows):
+    """Write rows (tuples in `columns` order) with the fastest path of the driver"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if dialect_name == 'postgresql':
+            buffer = io.StringIO()
+            # Empty unquoted fields are NULL in COPY's CSV format
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY device_data ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ', '.join('?' for _ in columns)
+            cursor.executemany(f"INSERT INTO device_data ({', '.join(columns)}) VALUES ({placeholders})", rows)
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load readings into device_data')
+    parser.add_argument('paths', nargs='+', help="CSV/NDJSON files, or '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+    parser.add_argument('--device', help='device_id for rows that do not have one')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='Rows per transaction')
+    parser.add_argument('--strict', action='store_true', help='Stop at the first invalid row')
+    args = parser.parse_args()
+
+    from app import app, db, run_write, update_derived_tables
+    parse_reading = READING_SCHEMA.parse
+
+    columns = ['device_id', 'timestamp'] + METRIC_FIELDS + ['created_at']
+    stats = {'loaded': 0, 'invalid': 0}
+    started = time.perf_counter()
+
+    def write_chunk(rows):
+        # The text format SQLAlchemy stores DateTime values in on SQLite; PostgreSQL parses it too
+        created_at = datetime.utcnow().isoformat(' ', 'microseconds')
+        tuples = [
+            (row['device_id'], row['timestamp'].isoformat(' ', 'microseconds'), *map(row.get, METRIC_FIELDS), created_at)
+            for row in rows
+        ]
+
+        def work():
+            copy_rows(db.session.connection().connection.dbapi_connection, dialect_name, columns, tuples)
+            update_derived_tables(rows)
+
+        run_write(work)
+        stats['loaded'] += len(rows)
+        elapsed = time.perf_counter() - started
+        print(f"  {stats['loaded']:,} rows loaded ({stats['loaded'] / elapsed:,.0f} rows/s)")
+
+    with app.app_context():
+        dialect_name = db.engine.dialect.name
+        for path in args.paths:
+            input_format = args.format or detect_format(path)
+            if input_format is None:
+                print(f"❌ Cannot tell the format of {path}: pass --format", file=sys.stderr)
+                sys.exit(1)
+            print(f"📥 Loading {path} ({input_format}) into {dialect_name}...")
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+            rows = []
+            try:
+                for line_number, record in read_records(stream, input_format):
+                    try:
+                        if isinstance(record, Exception):
+                            raise record
+                        if args.device and isinstance(record, dict):
+                            record.setdefault('device_id', args.device)
+                        rows.append(parse_reading(record))
+                    except ValueError as e:
+                        stats['invalid'] += 1
+                        if args.strict or stats['invalid'] <= 10:
+                            print(f"  ⚠️ {path}:{line_number}: {e}", file=sys.stderr)
+                        if args.strict:
+                            sys.exit(1)
+                        continue
+                    if len(rows) >= args.chunk_rows:
+                        write_chunk(rows)
+                        rows = []
+                if rows:
+                    write_chunk(rows)
+            except Exception as e:
+                print(f"\n❌ Load failed after {stats['loaded']:,} rows: {str(e)}", file=sys.stderr)
+                sys.exit(1)
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Loaded {stats['loaded']:,} rows in {elapsed:.1f}s "
+          f"({stats['loaded'] / max(elapsed, 1e-9):,.0f} rows/s), {stats['invalid']:,} invalid")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Synthetic windmill data, generated a whole column at a time with NumPy.
+
+Each device gets smoothly varying wind with gusts, rpm and generator
+voltage following the wind through a cut-in/rated power curve, a diurnal
+solar voltage with passing clouds, temperature/humidity/pressure weather,
+plus gaps (device offline) and sensor outliers. Used by
+/api/v1/dev/simulate and to seed datasets for load tests and benchmarks:
+
+    cd backend
+    python datagen.py --devices 10 --days 90 --interval 10            # into DATABASE_URL
+    python datagen.py --devices 10 --days 7 --out fixture.ndjson       # file for bulk_load.py
+"""
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+
+METRICS = ['voltage_v', 'current_a', 'power_w', 'rpm', 'pressure_hpa', 'temp_c',
+           'humidity_pct', 'wind_mps', 'wind_voltage_v', 'solar_voltage_v']
+# Devices report local time-of-day effects in Taiwan (UTC+8)
+LOCAL_UTC_OFFSET_HOURS = 8
+
+CUT_IN_MPS = 2.0  # Below this the rotor does not turn
+RATED_MPS = 11.0  # Output stops growing above this
+RATED_WIND_W = 60.0
+PEAK_SOLAR_W = 20.0
+
+
+def smooth(noise, window):
+    """Moving average over `window` samples (same length): turns white noise into a slow signal"""
+    window = max(1, min(int(window), len(noise)))
+    padded = np.concatenate([np.zeros(window - 1), noise])
+    sums = np.cumsum(padded)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums[window - 1:] / window
+
+
+def gap_mask(n, interval_s, rng, gaps_per_day, mean_gap_s):
+    """Boolean mask of samples that fall into offline periods"""
+    days = n * interval_s / 86400
+    count = rng.poisson(gaps_per_day * days)
+    if count == 0:
+        return np.zeros(n, dtype=bool)
+    starts = rng.integers(0, n, count)
+    ends = np.minimum(starts + np.ceil(rng.exponential(mean_gap_s / interval_s, count)).astype(np.int64), n)
+    edges = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(edges, starts, 1)
+    np.add.at(edges, ends, -1)
+    return np.cumsum(edges[:-1]) > 0
+
+
+def generate_device(timestamps, interval_s, rng, gaps_per_day=0.5, mean_gap_s=1200, outlier_rate=0.001):
+    """Readings of one device at `timestamps` (datetime64[us], UTC).
+
+    Returns (timestamps, {metric: float array}) with offline samples removed;
+    NaN marks a missing value.
+    """
+    n = len(timestamps)
+    per_hour = max(1.0, 3600 / interval_s)
+    epoch_s = timestamps.astype('datetime64[s]').astype(np.int64)
+    local_hour = ((epoch_s / 3600 + LOCAL_UTC_OFFSET_HOURS) % 24)
+
+    # Wind: a per-device climate, a slow weather trend and short gusts
+    mean_wind = rng.weibull(2.0) * 2.5 + 2.5
+    trend = smooth(rng.normal(0, 1, n), 6 * per_hour) * np.sqrt(6 * per_hour) * 0.6
+    gusts = smooth(rng.normal(0, 1, n), max(1, per_hour / 60)) * 0.8
+    wind = np.clip(mean_wind + trend + gusts, 0, 25)
+
+    # Power curve: cubic between cut-in and rated wind speed, flat above
+    spinning = wind > CUT_IN_MPS
+    fraction = np.clip((wind - CUT_IN_MPS) / (RATED_MPS - CUT_IN_MPS), 0, 1)
+    wind_power = RATED_WIND_W * fraction ** 3
+    rpm = np.where(spinning, 900 + fraction * 3300 + rng.normal(0, 40, n), 0)
+    wind_voltage = np.where(spinning, rpm / 3400 * 5 + rng.normal(0, 0.05, n), 0)
+
+    # Solar: daylight arc with clouds drifting over
+    sun = np.clip(np.sin(np.pi * (local_hour - 6) / 12), 0, 1)
+    clouds = np.clip(0.75 + smooth(rng.normal(0, 1, n), 2 * per_hour) * np.sqrt(2 * per_hour) * 0.15, 0.1, 1)
+    daylight = sun * clouds
+    solar_voltage = np.where(sun > 0, 14 + 5 * daylight ** 0.3 + rng.normal(0, 0.2, n), rng.uniform(0, 0.3, n))
+
+    # Battery bus voltage rises with charging; current follows total generated power
+    charging = wind_power + PEAK_SOLAR_W * daylight
+    voltage = 11.8 + 1.2 * charging / (RATED_WIND_W + PEAK_SOLAR_W) + rng.normal(0, 0.05, n)
+    current = np.clip(charging / voltage + rng.normal(0, 0.02, n), 0, None)
+
+    # Weather
+    temp = (25 + 4 * np.sin(2 * np.pi * (local_hour - 9) / 24)
+            + smooth(rng.normal(0, 1, n), 24 * per_hour) * np.sqrt(24 * per_hour) * 0.3
+            + rng.normal(0, 0.2, n))
+    humidity = np.clip(55 - 2 * (temp - 25) + rng.normal(0, 2, n), 15, 100)
+    pressure = 1013 + smooth(rng.normal(0, 1, n), 12 * per_hour) * np.sqrt(12 * per_hour) * 0.8
+
+    columns = {
+        'voltage_v': np.round(voltage, 2),
+        'current_a': np.round(current, 2),
+        'rpm': np.round(rpm),
+        'pressure_hpa': np.round(pressure, 2),
+        'temp_c': np.round(temp, 1),
+        'humidity_pct': np.round(humidity, 1),
+        'wind_mps': np.round(wind, 1),
+        'wind_voltage_v': np.round(wind_voltage, 2),
+        'solar_voltage_v': np.round(solar_voltage, 2),
+    }
+
+    # Sensor glitches: spikes, zeros and dropped values
+    for values in columns.values():
+        glitches = np.flatnonzero(rng.random(n) < outlier_rate)
+        kind = rng.integers(0, 3, len(glitches))
+        spikes = glitches[kind == 0]
+        values[spikes] = np.round(values[spikes] * rng.uniform(2, 5, len(spikes)), 2)
+        values[glitches[kind == 1]] = 0
+        values[glitches[kind == 2]] = np.nan
+
+    # Derived the same way as ingest: P = V x I
+    columns['power_w'] = columns['voltage_v'] * columns['current_a']
+
+    online = ~gap_mask(n, interval_s, rng, gaps_per_day, mean_gap_s)
+    return timestamps[online], {name: values[online] for name, values in columns.items()}
+
+
+def generate(device_ids, start, end, interval_s=60, seed=None, **options):
+    """Yield (device_id, timestamps, columns) for each device over [start, end)"""
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(np.datetime64(start, 'us'), np.datetime64(end, 'us'),
+                           np.timedelta64(int(interval_s * 1e6), 'us'))
+    for device_id in device_ids:
+        # Devices do not report in lockstep
+        jitter = rng.integers(0, int(interval_s * 1e6), len(timestamps)).astype('timedelta64[us]')
+        device_timestamps, columns = generate_device(timestamps + jitter, interval_s, rng, **options)
+        yield device_id, device_timestamps, columns
+
+
+def to_rows(device_id, timestamps, columns, chunk_rows=None):
+    """DeviceData column dicts for a core insert, optionally in chunks of `chunk_rows`"""
+    values = []
+    for name in METRICS:
+        column = columns[name].astype(object)
+        column[np.isnan(columns[name])] = None
+        if name == 'rpm':
+            column = [int(v) if v is not None else None for v in column]
+        values.append(column)
+    stamps = timestamps.tolist()
+    step = chunk_rows or max(len(stamps), 1)
+    for offset in range(0, len(stamps), step):
+        chunk = zip(stamps[offset:offset + step], *[column[offset:offset + step] for column in values])
+        yield [{'device_id': device_id, 'timestamp': ts, **dict(zip(METRICS, row))} for ts, *row in chunk]
+
+
+def write_file(path, generated):
+    """Write readings in the ingest format (ts in milliseconds) as CSV or NDJSON"""
+    count = 0
+    fields = ['device_id', 'ts'] + [m for m in METRICS if m != 'power_w']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f) if path.endswith('.csv') else None
+        if writer:
+            writer.writerow(fields)
+        for device_id, timestamps, columns in generated:
+            for rows in to_rows(device_id, timestamps, columns, chunk_rows=50000):
+                for row in rows:
+                    reading = {'device_id': device_id,
+                               'ts': int((row['timestamp'] - datetime(1970, 1, 1)).total_seconds() * 1000),
+                               **{m: row[m] for m in fields[2:]}}
+                    if writer:
+                        writer.writerow(['' if reading[k] is None else reading[k] for k in fields])
+                    else:
+                        f.write(json.dumps(reading) + '\n')
+                count += len(rows)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic device data')
+    parser.add_argument('--devices', type=int, default=10, help='Number of devices (esp32-000, esp32-001, ...)')
+    parser.add_argument('--prefix', default='esp32-', help='device_id prefix')
+    parser.add_argument('--days', type=float, default=7, help='Days of history ending now')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds between readings')
+    parser.add_argument('--seed', type=int, help='Random seed for reproducible fixtures')
+    parser.add_argument('--gaps-per-day', type=float, default=0.5)
+    parser.add_argument('--outlier-rate', type=float, default=0.001)
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='Rows per insert transaction')
+    parser.add_argument('--out', help='Write a .csv/.ndjson file instead of inserting')
+    args = parser.parse_args()
+
+    end = datetime.utcnow()
+    device_ids = [f"{args.prefix}{i:03d}" for i in range(args.devices)]
+    generated = generate(device_ids, end - timedelta(days=args.days), end, args.interval, args.seed,
+                         gaps_per_day=args.gaps_per_day, outlier_rate=args.outlier_rate)
+    started = time.perf_counter()
+
+    if args.out:
+        count = write_file(args.out, generated)
+        print(f"✅ Wrote {count:,} readings to {args.out} in {time.perf_counter() - started:.1f}s")
+        return
+
+    from sqlalchemy import insert
+    from app import app, db, run_write, update_derived_tables, DeviceData
+
+    count = 0
+    with app.app_context():
+        try:
+            for device_id, timestamps, columns in generated:
+                for rows in to_rows(device_id, timestamps, columns, args.chunk_rows):
+                    def work():
+                        db.session.execute(insert(DeviceData), rows)
+                        update_derived_tables(rows)
+                    run_write(work)
+                    count += len(rows)
+                elapsed = time.perf_counter() - started
+                print(f"  {device_id}: {count:,} rows ({count / elapsed:,.0f} rows/s)")
+        except Exception as e:
+            print(f"\n❌ Generation failed after {count:,} rows: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+    print(f"\n✅ Inserted {count:,} readings for {args.devices} device(s) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
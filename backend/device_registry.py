@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Device registry: one row per device in `devices` with its latest reading
+and last_seen, upserted by ingest so /api/v1/devices is a single read.
+
+Rebuild from raw data (also done automatically on startup when empty):
+    cd backend
+    python device_registry.py rebuild
+"""
+import sys
+import argparse
+from sqlalchemy import delete, func, select
+from models import Device, DeviceData, upsert
+
+# Reading columns copied from DeviceData into the registry
+REGISTRY_METRICS = [c.name for c in Device.__table__.columns if c.name not in ('device_id', 'last_seen')]
+
+
+def upsert_devices(session, rows):
+    """Record the newest reading of each device; runs inside the caller's transaction.
+
+    Older readings (e.g. replayed or out-of-order batches) never overwrite
+    a newer one.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row['device_id'])
+        if current is None or row['timestamp'] >= current['timestamp']:
+            latest[row['device_id']] = row
+    if not latest:
+        return
+
+    # Rows lock in the order given: sorting by device_id keeps concurrent batches from deadlocking
+    values = [
+        {'device_id': device_id, 'last_seen': row['timestamp'], **{m: row.get(m) for m in REGISTRY_METRICS}}
+        for device_id, row in sorted(latest.items())
+    ]
+    session.execute(_upsert_statement(session), values)
+
+
+# Built once per dialect instead of on every ingest
+_upsert_statements = {}
+
+
+def _upsert_statement(session):
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in _upsert_statements:
+        stmt = upsert(session, Device)
+        _upsert_statements[dialect_name] = stmt.on_conflict_do_update(
+            index_elements=['device_id'],
+            set_={c: stmt.excluded[c] for c in ['last_seen'] + REGISTRY_METRICS},
+            where=stmt.excluded.last_seen >= Device.__table__.c.last_seen
+        )
+    return _upsert_statements[dialect_name]
+
+
+def rebuild(session):
+    """Repopulate the registry from the latest raw row of every device"""
+    newest = select(DeviceData.device_id, func.max(DeviceData.timestamp).label('timestamp'))\
+        .group_by(DeviceData.device_id).subquery()
+    stmt = select(DeviceData.device_id, DeviceData.timestamp, *[getattr(DeviceData, m) for m in REGISTRY_METRICS])\
+        .join(newest, (DeviceData.device_id == newest.c.device_id) & (DeviceData.timestamp == newest.c.timestamp))
+
+    session.execute(delete(Device))
+    rows = [row._asdict() for row in session.execute(stmt)]
+    upsert_devices(session, rows)
+    session.commit()
+    return len({row['device_id'] for row in rows})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the device registry')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help='Rebuild the registry from raw data')
+    parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        try:
+            count = rebuild(db.session)
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Rebuild failed: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Device registry rebuilt: {count} device(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Server-side downsampling for /api/v1/history.
+
+All functions take time-ordered NumPy arrays (`ts` in epoch milliseconds,
+metrics as float arrays with NaN for missing values) so the payload size
+depends on the requested number of points, not on the length of the range.
+"""
+import numpy as np
+
+
+def lttb_indices(ts, values, points):
+    """Largest-Triangle-Three-Buckets: indexes of the rows to keep.
+
+    Rows whose value is NaN are never selected. The first and last valid
+    rows are always kept (only the first when points is 1). At most
+    `points` indexes are returned.
+    """
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= points:
+        return valid
+    if points < 3:
+        # No bucket between the endpoints
+        return valid[[0, -1][:points]]
+
+    x = ts[valid].astype(np.float64)
+    y = values[valid]
+    n = len(valid)
+
+    # Bucket boundaries for the n - 2 points between the first and last
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Average of each bucket, used as the third vertex of the triangle
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    prev = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[prev] - avg_x[i + 1]) * (by - y[prev]) - (x[prev] - bx) * (avg_y[i + 1] - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return valid[selected]
+
+
+def bucket_aggregate(ts, columns, points, start_ms=None, end_ms=None):
+    """Split [start_ms, end_ms] into `points` equal time buckets and aggregate raw values.
+
+    Returns (bucket_ts, stats) where bucket_ts holds the bucket start times
+    of non-empty buckets and stats maps each column name to a dict of
+    'min', 'max' and 'avg' arrays (NaN where a bucket has no value).
+    """
+    partials = {}
+    for name, values in columns.items():
+        present = ~np.isnan(values)
+        partials[name] = {
+            'count': present.astype(np.int64),
+            'sum': np.where(present, values, 0.0),
+            'min': values,
+            'max': values,
+        }
+    return bucket_combine(ts, partials, points, start_ms, end_ms)
+
+
+def bucket_combine(ts, partials, points, start_ms=None, end_ms=None):
+    """Like bucket_aggregate, but for pre-aggregated rows (e.g. rollups).
+
+    `partials` maps each column name to 'count', 'sum', 'min' and 'max'
+    arrays aligned with `ts`.
+    """
+    if len(ts) == 0:
+        return ts, {name: {'min': ts, 'max': ts, 'avg': ts} for name in partials}
+
+    start_ms = int(ts[0]) if start_ms is None else start_ms
+    end_ms = int(ts[-1]) if end_ms is None else end_ms
+    width = max((end_ms - start_ms) / points, 1)
+
+    bucket = np.clip(((ts - start_ms) // width).astype(np.int64), 0, points - 1)
+    # Rows are time ordered, so each bucket is a contiguous run
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    bucket_ts = (start_ms + bucket[starts] * width).astype(np.int64)
+
+    stats = {}
+    for name, partial in partials.items():
+        counts = np.add.reduceat(partial['count'], starts)
+        sums = np.add.reduceat(partial['sum'], starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(counts > 0, sums / counts, np.nan)
+        stats[name] = {
+            'min': np.fmin.reduceat(partial['min'], starts),
+            'max': np.fmax.reduceat(partial['max'], starts),
+            'avg': avg,
+        }
+    return bucket_ts, stats
@@ -1,5 +1,9 @@
 # Gunicorn configuration file
 import os
+import tempfile
+
+# Prometheus metrics: every worker writes to this directory and /metrics merges them
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'windmill-metrics'))
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
@@ -38,3 +42,26 @@ tmp_upload_dir = None
 # SSL
 keyfile = None
 certfile = None
+
+
+# Server hooks
+def on_starting(server):
+    """Start with empty metrics; files left by a previous run would be merged in"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.db'):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    """Drop the live gauges (SSE subscribers, pool connections) of a worker that exited"""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Drain the write-behind ingest buffer before the worker goes away"""
+    from app import ingest_buffer
+    if ingest_buffer is not None:
+        ingest_buffer.stop()
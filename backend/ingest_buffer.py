@@ -0,0 +1,228 @@
+"""
+Write-behind buffer for ingest: validated rows are queued in memory and a
+background thread commits them in groups (group commit).
+
+Rows are acknowledged before they are stored, so a failed flush must not
+lose them: connection-level errors retry the group with backoff (the queue
+fills up meanwhile and ingest answers 503), and any other error splits the
+group in halves until the rows that cannot be stored are isolated. Only
+those are dropped, each logged with its device_id.
+"""
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from queue import Full
+from sqlalchemy import insert
+from sqlalchemy import exc
+from lazy_start import PerProcessStart
+
+logger = logging.getLogger(__name__)
+
+# Errors about the database connection rather than the rows: retry the same group
+RETRY_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+RETRY_DELAY_MAX_S = 5.0
+# Attempts per group once stop() was called, so shutdown does not wait forever
+RETRIES_WHEN_STOPPING = 3
+
+
+class IngestBuffer:
+    """Bounded in-process queue of DeviceData rows with a group-commit flusher.
+
+    A flush happens when `flush_rows` rows are pending or `flush_ms` has
+    passed since the oldest pending row arrived, whichever comes first.
+    `before_commit(rows)` runs inside the flush transaction and
+    `on_flush(rows)` after it commits. With `run_write`, the flush
+    transaction is handed to it (e.g. the SQLite single writer).
+    """
+
+    def __init__(self, app, db, model, max_size=10000, flush_rows=500, flush_ms=200,
+                 before_commit=None, on_flush=None, run_write=None):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.max_size = max_size
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+        self.before_commit = before_commit
+        self.on_flush = on_flush
+        self.run_write = run_write
+
+        self._pending = deque()
+        self._arrivals = deque()  # [enqueued at, rows of that submit still pending], oldest first
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        # Started lazily so each gunicorn worker gets its own flusher after fork
+        self._flusher = PerProcessStart(self._start_flusher, alive=lambda: self._thread.is_alive())
+        atexit.register(self.stop)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'flushed': 0,
+            'failed': 0,
+            'retries': 0,
+            'flushes': 0,
+            'flush_ms_total': 0.0,
+            'flush_ms_max': 0.0,
+            'flush_ms_last': 0.0,
+        }
+
+    def submit(self, rows):
+        """Queue rows for writing. Raises queue.Full if they do not all fit."""
+        if not rows:
+            return
+        with self._cond:
+            if self._stopping:
+                raise Full('Ingest buffer is shutting down')
+            if len(self._pending) + len(rows) > self.max_size:
+                with self._stats_lock:
+                    self._stats['rejected'] += len(rows)
+                raise Full('Ingest buffer is full')
+            self._arrivals.append([time.monotonic(), len(rows)])
+            self._pending.extend(rows)
+            self._flusher.ensure()
+            self._cond.notify()
+
+        with self._stats_lock:
+            self._stats['enqueued'] += len(rows)
+
+    def _start_flusher(self):
+        self._thread = threading.Thread(target=self._run, name='ingest-flusher', daemon=True)
+        self._thread.start()
+
+    def _take_batch(self):
+        """Wait until a group is due, then pop it. Returns None once stopped and drained."""
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = self._arrivals[0][0] + self.flush_ms / 1000.0
+            while len(self._pending) < self.flush_rows and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(len(self._pending), self.flush_rows)
+            batch = [self._pending.popleft() for _ in range(count)]
+            # The rows left keep their own arrival time, so they are not held for another full flush_ms
+            while count:
+                taken = min(count, self._arrivals[0][1])
+                self._arrivals[0][1] -= taken
+                count -= taken
+                if not self._arrivals[0][1]:
+                    self._arrivals.popleft()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _write(self, rows):
+        """Insert rows and run before_commit in one committed transaction"""
+        def write():
+            self.db.session.execute(insert(self.model), rows)
+            if self.before_commit:
+                self.before_commit(rows)
+
+        with self.app.app_context():
+            try:
+                if self.run_write:
+                    self.run_write(write)
+                else:
+                    write()
+                    self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                raise
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        written = []
+        groups = [batch]  # stack of groups still to write, next one last
+        attempts = 0
+        while groups:
+            group = groups.pop()
+            try:
+                self._write(group)
+            except RETRY_ERRORS as e:
+                attempts += 1
+                waiting = len(group) + sum(map(len, groups))
+                if self._stopping and attempts >= RETRIES_WHEN_STOPPING:
+                    logger.error(f"❌ Ingest buffer flush failed while stopping, lost {waiting} row(s): {str(e)}")
+                    with self._stats_lock:
+                        self._stats['failed'] += waiting
+                    break
+                delay = min(0.1 * 2 ** (attempts - 1), RETRY_DELAY_MAX_S)
+                logger.warning(f"⚠️ Ingest buffer flush failed, retrying {waiting} row(s) in {delay:.1f}s: {str(e)}")
+                with self._stats_lock:
+                    self._stats['retries'] += 1
+                groups.append(group)
+                time.sleep(delay)
+                continue
+            except Exception as e:
+                if len(group) > 1:
+                    # Split to find the rows the database refuses; the rest are stored
+                    middle = len(group) // 2
+                    groups += [group[middle:], group[:middle]]
+                    continue
+                row = group[0]
+                logger.error(f"❌ Ingest buffer dropped a row that cannot be stored: "
+                             f"device_id={row.get('device_id')!r}: {str(e)}")
+                with self._stats_lock:
+                    self._stats['failed'] += 1
+                continue
+            attempts = 0
+            written += group
+
+        if not written:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['flushed'] += len(written)
+            self._stats['flushes'] += 1
+            self._stats['flush_ms_total'] += elapsed_ms
+            self._stats['flush_ms_last'] = elapsed_ms
+            self._stats['flush_ms_max'] = max(self._stats['flush_ms_max'], elapsed_ms)
+
+        if self.on_flush:
+            try:
+                self.on_flush(written)
+            except Exception as e:
+                logger.error(f"❌ Ingest buffer flush callback failed: {str(e)}")
+
+    def stop(self, timeout=30):
+        """Stop accepting rows and drain everything still pending"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is None:
+            return
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        logger.info(f"🛑 Ingest buffer drained: {self._stats['flushed']} row(s) flushed")
+
+    def stats(self):
+        """Counters for queue depth and flush latency"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        flushes = stats.pop('flushes')
+        total = stats.pop('flush_ms_total')
+        stats.update({
+            'queue_depth': len(self._pending),
+            'max_size': self.max_size,
+            'flushes': flushes,
+            'flush_ms_avg': round(total / flushes, 3) if flushes else 0.0,
+            'flush_ms_max': round(stats['flush_ms_max'], 3),
+            'flush_ms_last': round(stats['flush_ms_last'], 3),
+        })
+        return stats
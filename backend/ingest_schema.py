@@ -0,0 +1,242 @@
+"""
+Ingest payload schema, shared by /api/v1/ingest, /api/v1/ingest/batch and
+bulk_load.py, and the compact binary ingest format.
+
+A reading is described once as a table of fields. Each field's converter
+is built when the module loads, and values that already have the right
+type (floats from JSON) are taken as-is. Apart from device_id, which must
+be a non-empty string that fits its column, the parser accepts exactly
+what the previous hand-written checks accepted and raises the same
+ValueError messages.
+
+JSON bodies are decoded with orjson when it is installed, else the
+standard library.
+
+The binary format (BINARY_CONTENT_TYPE) carries the same readings as
+fixed-size records, decoded with a precompiled struct.Struct straight into
+column values:
+
+    3s  magic 'WMI'
+    B   format version (selects the field map in BINARY_LAYOUTS)
+    B   device_id length, then the device_id in UTF-8
+    H   number of readings, then that many records:
+        q   ts, milliseconds since epoch
+        H   presence mask: bit i set = field i of the version's map was sent
+        i   one int32 per field, the value times the field's scale
+
+All little-endian. Scaled integers (e.g. millivolts) decode to the same
+decimal a JSON client would send, so stored values, the dashboard and SSE
+output do not depend on the format.
+"""
+import json
+import struct
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_DECODER = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data):
+    """Decode a JSON document (bytes or str); raises ValueError when it is invalid"""
+    if orjson is not None:
+        return orjson.loads(data)  # orjson.JSONDecodeError is a ValueError
+    return json.loads(data)
+
+
+class Field:
+    """One payload field: `kind` is 'raw' (stored as sent), 'str' (non-empty string of at most
+    `max_length` characters), 'timestamp' (ms since epoch), 'float' or 'int'"""
+    __slots__ = ('name', 'kind', 'required', 'column', 'max_length')
+
+    def __init__(self, name, kind, required=False, column=None, max_length=None):
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.column = column or name
+        self.max_length = max_length
+
+
+# Values of these types skip the converter (floats from JSON need no float() call)
+_TAKEN_AS_IS = {'float': float, 'int': int}
+
+
+def _converter(field):
+    """Function value -> column value for one field; raises ValueError with the client-facing message"""
+    name = field.name
+    if field.kind == 'raw':
+        return None
+    if field.kind == 'str':
+        limit = f' of at most {field.max_length} characters' if field.max_length is not None else ''
+        message = f"Invalid type for field '{name}': expected a non-empty string{limit}"
+        max_length = field.max_length
+
+        def convert(value):
+            if type(value) is not str or not value or (max_length is not None and len(value) > max_length):
+                raise ValueError(message)
+            return value
+        return convert
+    if field.kind == 'timestamp':
+        message = f"Invalid type for field '{name}': expected milliseconds since epoch"
+
+        def convert(value):
+            try:
+                return datetime.utcfromtimestamp(float(value) / 1000.0)
+            except (ValueError, TypeError, OverflowError, OSError):
+                raise ValueError(message)
+        return convert
+    target = {'float': float, 'int': int}[field.kind]
+    message = f"Invalid type for field '{name}': cannot convert to {field.kind}"
+
+    def convert(value):
+        if value is None or type(value) is target:
+            return value
+        try:
+            return target(value)
+        except (ValueError, TypeError):
+            raise ValueError(message)
+    return convert
+
+
+class Schema:
+    """Validate a reading against a table of fields: parse(data) -> column dict"""
+
+    def __init__(self, fields, derived=()):
+        self.fields = tuple(fields)
+        self.derived = tuple(derived)  # (column, function of the column dict)
+        self.required = tuple(field.name for field in self.fields if field.required)
+        # (payload name, column, type taken as-is, converter or None), built once
+        self.converters = tuple((field.name, field.column, _TAKEN_AS_IS.get(field.kind), _converter(field))
+                                for field in self.fields)
+
+    def parse(self, data):
+        if not isinstance(data, dict):
+            raise ValueError('Reading must be a JSON object')
+        # Required fields are checked first, in declaration order
+        for name in self.required:
+            if name not in data:
+                raise ValueError(f'Missing required field: {name}')
+        get = data.get
+        values = {}
+        for name, column, as_is, convert in self.converters:
+            value = get(name)
+            if convert is not None and type(value) is not as_is:
+                value = convert(value)
+            values[column] = value
+        for column, compute in self.derived:
+            values[column] = compute(values)
+        return values
+
+
+class BinaryLayout:
+    """One version of the binary format: its field map and precompiled record struct"""
+
+    def __init__(self, version, fields, columns, derived=()):
+        self.version = version
+        self.fields = tuple(fields)  # (column, scale); scale 1 = integer column
+        self.record = struct.Struct('<qH' + 'i' * len(self.fields))
+        self.derived = tuple(derived)
+        # Every column of a decoded row, None until a record sets it
+        self.empty = dict.fromkeys(column for column in columns if column not in ('device_id', 'timestamp'))
+        # (position in the record, presence bit, column, scale)
+        self.slots = tuple((i, 1 << i, column, scale) for i, (column, scale) in enumerate(self.fields))
+
+    def decode(self, device_id, records):
+        """Column dicts for records from record.iter_unpack()"""
+        rows = []
+        for index, (ts, mask, *raw) in enumerate(records):
+            try:
+                timestamp = datetime.utcfromtimestamp(ts / 1000.0)
+            except (ValueError, OverflowError, OSError):
+                raise ValueError(f"Invalid 'ts' in reading {index}: expected milliseconds since epoch")
+            row = {'device_id': device_id, 'timestamp': timestamp}
+            row.update(self.empty)
+            for i, bit, column, scale in self.slots:
+                if mask & bit:
+                    row[column] = raw[i] if scale == 1 else raw[i] / scale
+            for column, compute in self.derived:
+                row[column] = compute(row)
+            rows.append(row)
+        return rows
+
+    def encode(self, device_id, readings):
+        """Encode ingest-style reading dicts (ts in ms); fields that are missing or None are not sent"""
+        device = device_id.encode('utf-8')
+        parts = [struct.pack('<3sBB', BINARY_MAGIC, self.version, len(device)), device,
+                 struct.pack('<H', len(readings))]
+        for reading in readings:
+            mask = 0
+            values = []
+            for i, (column, scale) in enumerate(self.fields):
+                value = reading.get(column)
+                if value is not None:
+                    mask |= 1 << i
+                    value = round(value * scale)
+                values.append(value or 0)
+            parts.append(self.record.pack(int(reading['ts']), mask, *values))
+        return b''.join(parts)
+
+
+def decode_binary(body):
+    """Decode a binary ingest body into DeviceData column values; raises ValueError when it is malformed"""
+    if len(body) < 7 or body[:3] != BINARY_MAGIC:
+        raise ValueError('Invalid binary body: bad magic')
+    version, id_length = body[3], body[4]
+    layout = BINARY_LAYOUTS.get(version)
+    if layout is None:
+        raise ValueError(f'Unsupported binary format version {version}')
+    if id_length == 0:
+        raise ValueError('Missing required field: device_id')
+    end = 5 + id_length
+    try:
+        device_id = body[5:end].decode('utf-8')
+        count, = _COUNT.unpack_from(body, end)
+    except UnicodeDecodeError:
+        raise ValueError('Invalid binary body: device_id is not UTF-8')
+    except struct.error:
+        raise ValueError('Invalid binary body: truncated header')
+    if len(device_id) > DEVICE_ID_MAX_LENGTH:
+        raise ValueError(f"Invalid type for field 'device_id': expected a non-empty string "
+                         f"of at most {DEVICE_ID_MAX_LENGTH} characters")
+    if len(body) - end - 2 != count * layout.record.size:
+        raise ValueError(f'Invalid binary body: expected {count} readings of {layout.record.size} bytes')
+    # A memoryview lets iter_unpack read the records without copying them
+    return layout.decode(device_id, layout.record.iter_unpack(memoryview(body)[end + 2:]))
+
+
+# Metric columns accepted by the ingest API (rpm is the only integer field)
+FLOAT_FIELDS = ['voltage_v', 'current_a', 'pressure_hpa', 'temp_c', 'humidity_pct',
+                'wind_mps', 'wind_voltage_v', 'solar_voltage_v']
+METRIC_FIELDS = ['voltage_v', 'current_a', 'power_w', 'rpm', 'pressure_hpa', 'temp_c',
+                 'humidity_pct', 'wind_mps', 'wind_voltage_v', 'solar_voltage_v']
+# DeviceData.device_id is a String(100)
+DEVICE_ID_MAX_LENGTH = 100
+
+
+def reading_power(values):
+    """P = V × I"""
+    voltage, current = values['voltage_v'], values['current_a']
+    return voltage * current if voltage is not None and current is not None else None
+
+
+READING_DERIVED = [('power_w', reading_power)]
+
+READING_SCHEMA = Schema(
+    [Field('device_id', 'str', required=True, max_length=DEVICE_ID_MAX_LENGTH),
+     Field('ts', 'timestamp', required=True, column='timestamp')]
+    + [Field(name, 'float') for name in FLOAT_FIELDS]
+    + [Field('rpm', 'int')],
+    derived=READING_DERIVED,
+)
+
+BINARY_CONTENT_TYPE = 'application/vnd.windmill.readings'
+BINARY_MAGIC = b'WMI'
+_COUNT = struct.Struct('<H')
+# Field maps by format version. New fields get a new version; existing versions never change
+BINARY_LAYOUTS = {
+    1: BinaryLayout(1, [(name, 1000) for name in FLOAT_FIELDS] + [('rpm', 1)],
+                    columns=FLOAT_FIELDS + ['rpm'], derived=READING_DERIVED),
+}
@@ -0,0 +1,184 @@
+"""
+WebSocket ingest channel: /api/v1/ingest/ws on the asyncio engine (stream_asgi.py).
+
+A device connects once, authenticates with the API key and then streams
+readings over the same connection, without per-reading HTTP requests:
+
+- auth: the `x-api-key` header on the handshake, or, for clients that cannot
+  set headers, a first message {"type": "auth", "api_key": "..."}
+- then the server sends {"type": "ready", "window": W, "max_readings": N}
+- each message is one reading, a JSON array of readings, {"readings": [...]}
+  or (binary message) a body in the binary ingest format, up to N readings
+- each message is answered, in order, with
+  {"type": "ack", "seq": n, "status": ..., "accepted": a, "rejected": r, "errors": [...]}
+  where seq counts the client's messages from 1 and errors lists
+  {"index", "error"} for rejected readings
+
+Readings go through the same validation, storage and broadcast as
+/api/v1/ingest/batch. Flow control: a client keeps at most W messages
+unacknowledged. Messages waiting on the server are stored together in one
+transaction; beyond W the server stops reading the socket, so TCP pushes
+back on the device. If the write-behind queue is full the ack has
+status "retry" and "retry_after" (seconds), and the message must be resent.
+"""
+import os
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full
+from app import (API_KEY, INGEST_BATCH_MAX, app as flask_app, db, decoded_reading, ingest_logger, parse_reading,
+                 store_rows)
+from ingest_schema import decode_binary, loads
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WINDOW = int(os.getenv('WS_INGEST_WINDOW', '16'))
+# Storage runs on these threads; keep it within the database pool size
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('WS_INGEST_THREADS', '4')), thread_name_prefix='ws-ingest')
+
+
+def decode_message(data, text):
+    """Readings of one message and the function turning each into column values"""
+    if data is not None:
+        return decode_binary(data), decoded_reading
+    try:
+        payload = loads(text)
+    except ValueError:
+        raise ValueError('Invalid JSON message')
+    if isinstance(payload, dict):
+        payload = payload['readings'] if 'readings' in payload else [payload]
+    if not isinstance(payload, list):
+        raise ValueError('Message must be a reading, an array of readings or {"readings": [...]}')
+    return payload, parse_reading
+
+
+def store_messages(group):
+    """Decode, validate and store a group of (seq, bytes, text) messages in one transaction; returns their acks"""
+    stages = metrics.StageTimer('ws')
+    acks = []
+    rows = []
+    for seq, data, text in group:
+        ack = {'type': 'ack', 'seq': seq, 'accepted': 0, 'rejected': 0, 'errors': []}
+        acks.append(ack)
+        try:
+            readings, parse = decode_message(data, text)
+            if not readings:
+                raise ValueError('Message has no readings')
+            if len(readings) > INGEST_BATCH_MAX:
+                raise ValueError(f'Batch too large: max {INGEST_BATCH_MAX} readings')
+        except ValueError as e:
+            ack.update(status='error', error=str(e))
+            continue
+        for i, reading in enumerate(readings):
+            try:
+                rows.append(parse(reading))
+                ack['accepted'] += 1
+            except ValueError as e:
+                ack['rejected'] += 1
+                ack['errors'].append({'index': i, 'error': str(e)})
+    stages.mark('validate')
+
+    status = 'success'
+    if rows:
+        with flask_app.app_context():
+            try:
+                status = 'success' if store_rows(rows, stages) is not None else 'queued'
+            except Full:
+                ingest_logger.warning("⏳ Ingest queue full: WebSocket messages to retry: %d", len(group))
+                for ack in acks:
+                    if ack['accepted']:
+                        ack.update(status='retry', retry_after=1, accepted=0)
+            except Exception as e:
+                ingest_logger.error("❌ Error in WebSocket ingest: %s", e)
+                db.session.rollback()
+                for ack in acks:
+                    if ack['accepted']:
+                        ack.update(status='error', error='Failed to store readings', accepted=0)
+    for ack in acks:
+        if 'status' not in ack:
+            ack['status'] = status if not ack['rejected'] else ('partial' if ack['accepted'] else 'error')
+    ingest_logger.info("🔌 WebSocket ingest: %d saved, %d messages", len(rows), len(group))
+    return acks
+
+
+async def process_messages(pending, send):
+    """Store queued messages, coalescing whatever is waiting, and acknowledge them in order"""
+    loop = asyncio.get_running_loop()
+    while True:
+        group = [await pending.get()]
+        while not pending.empty() and group[-1] is not None:
+            group.append(pending.get_nowait())
+        finished = group[-1] is None
+        group = [item for item in group if item is not None]
+        if group:
+            acks = await loop.run_in_executor(executor, store_messages, group)
+            for ack in acks:
+                await send({'type': 'websocket.send', 'text': json.dumps(ack)})
+        if finished:
+            return
+
+
+async def authenticate(scope, receive, send):
+    """Accept the connection if the API key is valid (header or first message)"""
+    headers = dict(scope.get('headers', ()))
+    provided_key = headers.get(b'x-api-key')
+    if provided_key is not None:
+        if provided_key.decode('latin-1') != API_KEY:
+            await send({'type': 'websocket.close', 'code': 1008})  # Rejected handshake: HTTP 403
+            return False
+        await send({'type': 'websocket.accept'})
+        return True
+
+    await send({'type': 'websocket.accept'})
+    message = await receive()
+    if message['type'] == 'websocket.disconnect':
+        return False
+    try:
+        auth = json.loads(message.get('text') or '')
+    except ValueError:
+        auth = None
+    if isinstance(auth, dict) and auth.get('type') == 'auth' and auth.get('api_key') == API_KEY:
+        return True
+    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'error': 'Invalid or missing API key'})})
+    await send({'type': 'websocket.close', 'code': 1008})
+    return False
+
+
+async def serve(scope, receive, send):
+    """WebSocket endpoint for streaming ingest"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if not await authenticate(scope, receive, send):
+        logger.warning("❌ WebSocket ingest rejected: invalid or missing API key")
+        return
+
+    client = scope.get('client') or ('?', 0)
+    logger.info(f"🔌 WebSocket ingest opened: {client[0]}:{client[1]}")
+    metrics.WS_INGEST_CONNECTIONS.inc()
+    await send({'type': 'websocket.send', 'text': json.dumps(
+        {'type': 'ready', 'window': WINDOW, 'max_readings': INGEST_BATCH_MAX})})
+
+    # A full queue stops the receive loop below, which stops reading the socket
+    pending = asyncio.Queue(maxsize=WINDOW)
+    processor = asyncio.ensure_future(process_messages(pending, send))
+    seq = 0
+    try:
+        while not processor.done():
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            seq += 1
+            await pending.put((seq, message.get('bytes'), message.get('text')))
+    finally:
+        # Messages already received are still stored; their acks may no longer reach the client
+        if not processor.done():
+            await pending.put(None)
+        try:
+            await processor
+        except Exception as e:
+            logger.warning(f"⚠️ WebSocket ingest: could not acknowledge: {str(e)}")
+        metrics.WS_INGEST_CONNECTIONS.dec()
+        logger.info(f"🔌 WebSocket ingest closed: {client[0]}:{client[1]} after {seq} messages")
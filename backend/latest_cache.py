@@ -0,0 +1,117 @@
+"""
+Per-process cache of the latest reading of each device, for /api/v1/latest
+and /api/v1/devices.
+
+Entries are written by this worker's ingest and by readings other workers
+publish through the SSE pub/sub backend, so every worker sees every reading.
+A reading only replaces an entry if it is newer. The cache warms from the
+device registry on first use and evicts the least recently used devices
+beyond `max_size`.
+
+Pub/sub delivery is best effort and some writes (dev endpoints, CLI loads)
+never reach it, so the cache re-warms from the registry every `ttl_s`
+seconds: a missed update is corrected within that time.
+"""
+import time
+import threading
+from collections import OrderedDict
+from lazy_start import PerProcessStart
+
+
+class LatestCache:
+    """Bounded LRU map of device_id -> (last_seen, metric values)"""
+
+    def __init__(self, max_size=10000, ttl_s=30):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._first_warm = PerProcessStart(self._load)
+        self._warmed_at = 0.0
+        # True while the cache holds every known device (no eviction since warm-up)
+        self._complete = False
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'rewarms': 0}
+
+    def warm(self, loader):
+        """Fill from `loader()` once per process, then again every `ttl_s` seconds: an iterable
+        of (device_id, last_seen, values) ordered from most to least recently seen."""
+        now = time.monotonic()
+        if self._first_warm.ensure(loader) or now - self._warmed_at < self.ttl_s:
+            return
+        # Refresh: claim it so concurrent requests keep serving the current entries
+        with self._lock:
+            if now - self._warmed_at < self.ttl_s:
+                return
+            self._warmed_at = now
+        rows = list(loader())
+        with self._lock:
+            self._merge(rows)
+            self._stats['rewarms'] += 1
+
+    def _load(self, loader):
+        # Entries inherited over fork are dropped; readings put while loading are kept
+        with self._lock:
+            self._entries.clear()
+        rows = list(loader())
+        with self._lock:
+            self._merge(rows)
+            self._warmed_at = time.monotonic()
+
+    def _merge(self, rows):
+        """Apply registry rows, keeping cached readings that are newer"""
+        for device_id, last_seen, values in reversed(rows[:self.max_size]):
+            current = self._entries.get(device_id)
+            if current is None or current[0] <= last_seen:
+                self._entries[device_id] = (last_seen, values)
+        evicted = False
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+            evicted = True
+        self._complete = len(rows) <= self.max_size and not evicted
+
+    def get(self, device_id):
+        """Return (last_seen, values) or None"""
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(device_id)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, device_id, last_seen, values):
+        """Store a reading unless a newer one is already cached"""
+        with self._lock:
+            current = self._entries.get(device_id)
+            if current is not None and current[0] > last_seen:
+                return
+            self._entries[device_id] = (last_seen, values)
+            self._entries.move_to_end(device_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+                self._complete = False
+
+    def is_complete(self):
+        return self._complete and self._first_warm.started()
+
+    def items(self):
+        """Snapshot of all entries as (device_id, last_seen, values)"""
+        with self._lock:
+            return [(device_id, last_seen, values) for device_id, (last_seen, values) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._complete = False
+        self._first_warm.reset()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_size'] = self.max_size
+        stats['complete'] = self.is_complete()
+        return stats
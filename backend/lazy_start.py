@@ -0,0 +1,48 @@
+"""
+Lazy per-process start-up for background threads and listeners.
+
+Objects built at import time are shared by every gunicorn worker forked from
+a preloading master, but their threads are not: a forked child only has the
+thread that called fork. Each component therefore starts its work on first
+use, once per process, and again if its thread has died.
+"""
+import os
+import threading
+
+
+class PerProcessStart:
+    """Call `start()` once per process, on the first `ensure()` there.
+
+    With `alive`, a start is also repeated when `alive()` turns false
+    (e.g. the background thread exited). Thread-safe: concurrent callers
+    wait for the one that is starting.
+    """
+
+    def __init__(self, start, alive=None):
+        self._start = start
+        self._alive = alive
+        self._lock = threading.Lock()
+        self.pid = None
+
+    def _running(self):
+        return self.pid == os.getpid() and (self._alive is None or self._alive())
+
+    def ensure(self, *args):
+        """Start if needed; returns True when this call did the start"""
+        if self._running():
+            return False
+        with self._lock:
+            if self._running():
+                return False
+            self._start(*args)
+            self.pid = os.getpid()
+            return True
+
+    def started(self):
+        """True once started in the current process"""
+        return self.pid == os.getpid()
+
+    def reset(self):
+        """Start again on the next `ensure()`"""
+        with self._lock:
+            self.pid = None
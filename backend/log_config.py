@@ -0,0 +1,116 @@
+"""
+Logging setup.
+
+LOG_MODE=text (default) logs formatted lines synchronously to stderr, as
+before. LOG_MODE=structured is meant for busy deployments:
+
+- records are written as JSON lines by a background thread (QueueHandler +
+  QueueListener); the request thread only enqueues the record, and message
+  formatting happens in the listener
+- per-request INFO logs on the ingest path (logger `app.ingest`) are
+  sampled: each message is logged at most once per LOG_SAMPLE_INTERVAL_S per
+  device, with the number of suppressed records attached
+- the queue is bounded; when it is full, records are dropped and counted
+  rather than blocking requests
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import logging.handlers
+from queue import Queue, Full
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+TEXT_DATEFMT = '%Y-%m-%d %H:%M:%S'
+LOG_MODES = ('text', 'structured')
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message plus `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeviceSampler(logging.Filter):
+    """Pass each INFO message at most once per `interval_s` per device; warnings always pass"""
+
+    def __init__(self, interval_s):
+        super().__init__()
+        self.interval_s = interval_s
+        self._last = {}  # (device_id, msg template) -> [last logged at, suppressed since]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        device_id = getattr(record, 'device_id', None)
+        # Logged before validation: an invalid device_id may be any JSON value
+        key = (device_id if isinstance(device_id, str) else None, record.msg)
+        now = time.monotonic()
+        state = self._last.get(key)
+        if state is not None and now - state[0] < self.interval_s:
+            state[1] += 1
+            return False
+        if state is not None and state[1]:
+            record.suppressed = state[1]
+        self._last[key] = [now, 0]
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records unformatted; drop them when the listener falls behind"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Same process: no need to pre-format or make the record picklable
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+def configure_logging(mode='text', level='INFO', sample_interval_s=10.0, queue_size=10000, sampled_logger='app.ingest'):
+    """Configure the root logger; returns the queue handler in structured mode (else None)"""
+    if mode not in LOG_MODES:
+        raise ValueError(f"Invalid LOG_MODE {mode!r}: must be one of {', '.join(LOG_MODES)}")
+    if mode == 'text':
+        logging.basicConfig(level=level, format=TEXT_FORMAT, datefmt=TEXT_DATEFMT)
+        return None
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter())
+    handler = BoundedQueueHandler(Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    # A forked worker (gunicorn --preload) needs its own listener thread
+    os.register_at_fork(after_in_child=listener.start)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [handler]
+    if sample_interval_s > 0:
+        logging.getLogger(sampled_logger).addFilter(DeviceSampler(sample_interval_s))
+    return handler
@@ -0,0 +1,94 @@
+"""
+Prometheus metrics served at /metrics.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set in gunicorn.conf.py) and /metrics merges the files of all workers, so a
+scrape that lands on any worker reports the whole service. Without the
+variable (python app.py, tests) metrics stay in process.
+"""
+import os
+import time
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+
+REQUEST_LATENCY = Histogram(
+    'windmill_http_request_duration_seconds', 'Request latency by route (SSE: until headers are sent)',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+INGEST_STAGE = Histogram(
+    'windmill_ingest_stage_duration_seconds', 'Time spent in each stage of the ingest endpoints',
+    ['endpoint', 'stage'], buckets=STAGE_BUCKETS)
+SSE_SUBSCRIBERS = Gauge(
+    'windmill_sse_subscribers', 'Open SSE streams', multiprocess_mode='livesum')
+WS_INGEST_CONNECTIONS = Gauge(
+    'windmill_ws_ingest_connections', 'Open WebSocket ingest connections', multiprocess_mode='livesum')
+SSE_DROPPED = Counter(
+    'windmill_sse_dropped_frames_total', 'Frames dropped because a subscriber queue was full')
+DB_POOL_CONNECTIONS = Gauge(
+    'windmill_db_pool_connections', 'Database connections by state (open, checked_out)', ['state'],
+    multiprocess_mode='livesum')
+DB_POOL_CAPACITY = Gauge(
+    'windmill_db_pool_capacity', 'Pool size plus max overflow', multiprocess_mode='livesum')
+DB_POOL_CHECKOUTS = Counter(
+    'windmill_db_pool_checkouts_total', 'Connections handed out by the pool')
+
+
+class StageTimer:
+    """Observe the time between consecutive mark() calls as stages of one request"""
+    __slots__ = ('endpoint', 'last')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        INGEST_STAGE.labels(self.endpoint, stage).observe(now - self.last)
+        self.last = now
+
+
+def instrument_pool(engine):
+    """Track open and checked-out connections of the engine's pool"""
+    pool = engine.pool
+    if hasattr(pool, 'size'):
+        DB_POOL_CAPACITY.set(pool.size() + max(getattr(pool, '_max_overflow', 0), 0))
+    open_connections = DB_POOL_CONNECTIONS.labels('open')
+    checked_out = DB_POOL_CONNECTIONS.labels('checked_out')
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        open_connections.inc()
+
+    @event.listens_for(engine, 'close')
+    def on_close(dbapi_connection, connection_record):
+        open_connections.dec()
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+        DB_POOL_CHECKOUTS.inc()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+
+def render():
+    """Exposition body and content type for /metrics"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of an exited worker (gunicorn child_exit hook)"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
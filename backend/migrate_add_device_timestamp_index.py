@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Migration script: Add composite (device_id, timestamp) index on device_data
+Usage: python migrate_add_device_timestamp_index.py
+"""
+import os
+import sys
+from sqlalchemy import create_engine, text
+
+# Get database URL from environment or use default
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///windmill.db')
+
+# Fix PostgreSQL URL format if needed
+if DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+
+print(f"Connecting to database: {DATABASE_URL}")
+
+try:
+    engine = create_engine(DATABASE_URL)
+
+    if 'sqlite' in DATABASE_URL.lower():
+        print("Detected SQLite database")
+        concurrently = ""
+    else:
+        print("Detected PostgreSQL database")
+        # Build without locking out ingest; needs autocommit (no transaction)
+        concurrently = "CONCURRENTLY "
+        engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    with engine.connect() as conn:
+        print("Creating ix_device_data_device_id_timestamp (device_id, timestamp)...")
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_device_data_device_id_timestamp "
+            f"ON device_data (device_id, timestamp)"
+        ))
+        conn.commit()
+        print("✓ Composite index ready")
+
+        # The composite index covers lookups by device_id alone
+        print("Dropping redundant ix_device_data_device_id...")
+        conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS ix_device_data_device_id"))
+        conn.commit()
+        print("✓ ix_device_data_device_id dropped")
+
+        conn.execute(text("ANALYZE device_data"))
+        conn.commit()
+        print("✓ Planner statistics updated")
+
+    print("\n✅ Migration completed successfully!")
+
+except Exception as e:
+    print(f"\n❌ Migration failed: {str(e)}", file=sys.stderr)
+    sys.exit(1)
@@ -0,0 +1,13 @@
+-- Migration: Composite (device_id, timestamp) index on device_data
+-- Date: 2026-10-17
+-- Description: Replace the single-column device_id index with a composite index so
+-- latest/history/range-count queries per device use an index-ordered scan
+
+-- For SQLite and PostgreSQL
+CREATE INDEX IF NOT EXISTS ix_device_data_device_id_timestamp ON device_data (device_id, timestamp);
+DROP INDEX IF EXISTS ix_device_data_device_id;
+
+-- On a busy PostgreSQL table, build the index without blocking writes instead
+-- (run outside a transaction):
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_device_data_device_id_timestamp ON device_data (device_id, timestamp);
+-- DROP INDEX CONCURRENTLY IF EXISTS ix_device_data_device_id;
@@ -1,15 +1,31 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
 
 
+def upsert(session, model):
+    """INSERT statement supporting on_conflict_do_update() for the session's database"""
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        return postgresql.insert(model)
+    if dialect_name == 'sqlite':
+        return sqlite.insert(model)
+    raise RuntimeError(f'Upserts are not supported on {dialect_name}')
+
+
 class DeviceData(db.Model):
     """Model for storing windmill device sensor data"""
     __tablename__ = 'device_data'
+    __table_args__ = (
+        # Serves every per-device query ordered by time (latest, history, range counts);
+        # also covers lookups by device_id alone, so no separate device_id index
+        db.Index('ix_device_data_device_id_timestamp', 'device_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    device_id = db.Column(db.String(100), nullable=False, index=True)
+    device_id = db.Column(db.String(100), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, index=True)
 
     # Sensor readings
@@ -46,3 +62,54 @@ class DeviceData(db.Model):
             'wind_voltage_v': self.wind_voltage_v,
             'solar_voltage_v': self.solar_voltage_v
         }
+
+
+class Device(db.Model):
+    """Registry of devices with their latest reading, kept up to date by ingest"""
+    __tablename__ = 'devices'
+
+    device_id = db.Column(db.String(100), primary_key=True)
+    last_seen = db.Column(db.DateTime, nullable=False)  # Timestamp of the latest reading (UTC)
+
+    # Latest sensor readings
+    voltage_v = db.Column(db.Float)
+    current_a = db.Column(db.Float)
+    power_w = db.Column(db.Float)
+    rpm = db.Column(db.Integer)
+    pressure_hpa = db.Column(db.Float)
+    temp_c = db.Column(db.Float)
+    humidity_pct = db.Column(db.Float)
+    wind_mps = db.Column(db.Float)
+    wind_voltage_v = db.Column(db.Float)
+    solar_voltage_v = db.Column(db.Float)
+
+    def __repr__(self):
+        return f'<Device {self.device_id} @ {self.last_seen}>'
+
+
+# Metric columns aggregated into rollups
+ROLLUP_METRICS = ['voltage_v', 'current_a', 'power_w', 'rpm', 'pressure_hpa', 'temp_c',
+                  'humidity_pct', 'wind_mps', 'wind_voltage_v', 'solar_voltage_v']
+
+
+class DeviceRollup(db.Model):
+    """Per-device aggregates of DeviceData over fixed time buckets (1 min / 1 h / 1 d).
+
+    For every metric there are <metric>_count (non-null readings),
+    <metric>_min, <metric>_max and <metric>_sum columns.
+    """
+    __tablename__ = 'device_rollup'
+
+    device_id = db.Column(db.String(100), primary_key=True)
+    resolution = db.Column(db.Integer, primary_key=True)  # Bucket width in seconds
+    bucket = db.Column(db.DateTime, primary_key=True)  # Bucket start (UTC)
+
+    def __repr__(self):
+        return f'<DeviceRollup {self.device_id} {self.resolution}s @ {self.bucket}>'
+
+
+for _metric in ROLLUP_METRICS:
+    setattr(DeviceRollup, f'{_metric}_count', db.Column(db.Integer, nullable=False, default=0))
+    setattr(DeviceRollup, f'{_metric}_min', db.Column(db.Float))
+    setattr(DeviceRollup, f'{_metric}_max', db.Column(db.Float))
+    setattr(DeviceRollup, f'{_metric}_sum', db.Column(db.Float, nullable=False, default=0.0))
@@ -0,0 +1,224 @@
+"""
+Pub/sub backends for SSE broadcasts.
+
+Readings are published as already-encoded SSE frames (bytes). Every backend
+delivers a published frame to the local SSE clients right
+away and forwards it to the other gunicorn workers, which deliver it to
+their own clients.
+
+- local:    in-process only (default, single worker)
+- unix:     one Unix datagram socket per worker in a shared directory
+- postgres: PostgreSQL LISTEN/NOTIFY
+"""
+import os
+import atexit
+import time
+import uuid
+import select
+import socket
+import logging
+import threading
+from lazy_start import PerProcessStart
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPubSub:
+    """In-process fan-out: readings only reach clients of this worker"""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def start(self):
+        pass
+
+    def publish(self, device_id, frame):
+        self.deliver(device_id, frame)
+
+    def close(self):
+        pass
+
+
+class _RemotePubSub(LocalPubSub):
+    """Base for backends that forward readings to other worker processes.
+
+    The listener is started lazily and restarted after fork, so it works
+    whether or not gunicorn preloads the app.
+    """
+
+    def __init__(self, deliver, on_remote=None):
+        super().__init__(deliver)
+        self.on_remote = on_remote
+        self._origin = None
+        self._listener = PerProcessStart(self._start_listener)
+        atexit.register(self.close)
+
+    def start(self):
+        self._listener.ensure()
+
+    def _start_listener(self):
+        self._origin = uuid.uuid4().hex
+        self._setup()
+        threading.Thread(target=self._listen, name='sse-pubsub', daemon=True).start()
+
+    def publish(self, device_id, frame):
+        self.start()
+        self.deliver(device_id, frame)
+        # Wire format: origin \n device_id \n frame (the frame is forwarded as-is)
+        message = f'{self._origin}\n{device_id}\n'.encode('utf-8') + frame
+        try:
+            self._send(message)
+        except Exception as e:
+            logger.error(f"❌ Pub/sub publish failed: {str(e)}")
+
+    def _receive(self, message):
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        try:
+            origin, device_id, frame = message.split(b'\n', 2)
+        except ValueError:
+            return
+        if origin.decode('ascii', 'replace') != self._origin:
+            device_id = device_id.decode('utf-8')
+            self.deliver(device_id, frame)
+            if self.on_remote is not None:
+                try:
+                    self.on_remote(device_id, frame)
+                except Exception as e:
+                    logger.error(f"❌ Pub/sub remote handler failed: {str(e)}")
+
+    def _setup(self):
+        raise NotImplementedError
+
+    def _listen(self):
+        raise NotImplementedError
+
+    def _send(self, message):
+        raise NotImplementedError
+
+
+class UnixSocketPubSub(_RemotePubSub):
+    """Each worker binds a datagram socket in `directory`; publishing sends to all of them.
+
+    Works with any database and needs no broker process, only a directory
+    shared by the workers on the same host.
+    """
+
+    def __init__(self, deliver, directory, on_remote=None):
+        super().__init__(deliver, on_remote)
+        self.directory = directory
+        self._sock = None
+        self._path = None
+        self._send_sock = None
+
+    def _setup(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f'{os.getpid()}.sock')
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self._path)
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.setblocking(False)
+
+    def _listen(self):
+        sock = self._sock
+        while True:
+            try:
+                message = sock.recv(65536)
+            except OSError:
+                return
+            self._receive(message)
+
+    def _send(self, message):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.directory, name)
+            if path == self._path:
+                continue
+            try:
+                self._send_sock.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker is gone; clean up its stale socket
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"⚠️ Pub/sub peer busy, dropped message: {name}")
+
+    def close(self):
+        # Sockets inherited over fork belong to the parent
+        if not self._listener.started():
+            return
+        if self._sock is not None:
+            self._sock.close()
+        if self._path and os.path.exists(self._path):
+            os.unlink(self._path)
+
+
+class PostgresPubSub(_RemotePubSub):
+    """PostgreSQL LISTEN/NOTIFY on `channel`; reaches workers on every host"""
+
+    def __init__(self, deliver, database_url, channel='windmill_sse', on_remote=None):
+        super().__init__(deliver, on_remote)
+        self.database_url = database_url
+        self.channel = channel
+        self._send_conn = None
+        self._send_lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(self.database_url)
+        conn.autocommit = True
+        return conn
+
+    def _setup(self):
+        self._send_conn = None
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._receive(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"❌ Pub/sub LISTEN connection lost: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _send(self, message):
+        with self._send_lock:
+            try:
+                if self._send_conn is None or self._send_conn.closed:
+                    self._send_conn = self._connect()
+                with self._send_conn.cursor() as cursor:
+                    cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, message.decode('utf-8')))
+            except Exception:
+                self._send_conn = None
+                raise
+
+
+def create_pubsub(backend, deliver, database_url=None, directory=None, on_remote=None):
+    """Build the pub/sub backend named by SSE_PUBSUB.
+
+    `on_remote(device_id, frame)` is called for frames published by other processes.
+    """
+    if backend == 'unix':
+        return UnixSocketPubSub(deliver, directory, on_remote=on_remote)
+    if backend == 'postgres':
+        if not database_url or not database_url.startswith('postgresql://'):
+            raise ValueError('SSE_PUBSUB=postgres requires a PostgreSQL DATABASE_URL')
+        return PostgresPubSub(deliver, database_url, on_remote=on_remote)
+    if backend == 'local':
+        return LocalPubSub(deliver)
+    raise ValueError(f'Unknown SSE_PUBSUB backend: {backend}')
@@ -0,0 +1,95 @@
+"""
+Short-TTL response cache with ETags for the polled read endpoints.
+
+Entries are keyed by path and normalized query parameters and remember
+the write version of the device they depend on (or of all devices).
+Ingest bumps the version of the device it wrote, so a cached response is
+served only while its device is unchanged and younger than the TTL.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from email.utils import formatdate
+
+CachedResponse = namedtuple('CachedResponse', 'body mimetype etag last_modified created versions')
+
+
+class ResponseCache:
+    """Per-process LRU of rendered responses, invalidated per device"""
+
+    def __init__(self, ttl=2.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._all_version = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    @staticmethod
+    def make_key(path, args):
+        """Cache key from the request path and its query parameters in sorted order"""
+        return path, tuple(sorted(args.items(multi=True)))
+
+    def versions(self, device_id):
+        """Write versions a response for `device_id` (None = every device) depends on"""
+        with self._lock:
+            return self._all_version, self._versions.get(device_id, 0) if device_id is not None else None
+
+    def invalidate(self, device_id=None):
+        """Called after a write to `device_id`, or with None to drop everything"""
+        with self._lock:
+            self._all_version += 1
+            if device_id is None:
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._versions[device_id] = self._versions.get(device_id, 0) + 1
+
+    def lookup(self, key, device_id):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                all_version, device_version = entry.versions
+                current = self._versions.get(device_id, 0) if device_id is not None else None
+                fresh = time.monotonic() - entry.created < self.ttl
+                if device_id is None:
+                    fresh = fresh and all_version == self._all_version
+                else:
+                    fresh = fresh and device_version == current
+                if fresh:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def store(self, key, versions, body, mimetype):
+        """Cache a rendered body; `versions` must be taken before the response was computed"""
+        entry = CachedResponse(
+            body=body,
+            mimetype=mimetype,
+            etag=hashlib.blake2b(body, digest_size=12).hexdigest(),
+            last_modified=formatdate(time.time(), usegmt=True),
+            created=time.monotonic(),
+            versions=versions
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats.update({'max_entries': self.max_entries, 'ttl': self.ttl})
+        return stats
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Retention for raw readings: device_data rows older than RETENTION_RAW_DAYS
+are reclaimed by a scheduled job. Rollups and the device registry are kept
+forever.
+
+On PostgreSQL, device_data can be converted to monthly range partitions
+(one-time migration, stop ingest first):
+    cd backend
+    python retention.py partition
+
+Expired months are then dropped as whole partitions, and the job keeps
+partitions created ahead of time. Rows outside every month land in the
+default partition: they are moved into their month when it is created, and
+expired ones are deleted in batches. Without partitioning (SQLite, or
+PostgreSQL before the migration) expired rows are deleted in short batches
+through the timestamp index, so ingest is never blocked for long.
+
+Run the job once by hand or from cron:
+    python retention.py run [--days 30]
+"""
+import re
+import sys
+import time
+import atexit
+import fcntl
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, text
+from models import DeviceData
+from lazy_start import PerProcessStart
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions kept ready beyond the current month
+PARTITION_MONTHS_AHEAD = 2
+LEGACY_PARTITION = 'device_data_legacy'
+DEFAULT_PARTITION = 'device_data_default'
+# Key of the PostgreSQL advisory lock that keeps one job running across workers and hosts
+ADVISORY_LOCK_KEY = 0x77696e64
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"device_data_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned(conn):
+    """True when device_data is a PostgreSQL partitioned table"""
+    if conn.dialect.name != 'postgresql':
+        return False
+    return conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('device_data')")) == 'p'
+
+
+def _parse_bound(value):
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn):
+    """Partitions of device_data as (name, lower, upper); bounds are None when open or DEFAULT"""
+    partitions = []
+    for name, bound in conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'device_data'::regclass
+        ORDER BY c.relname
+    """)):
+        match = re.search(r"FROM \((.+?)\) TO \((.+?)\)", bound)
+        if match:
+            partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+        else:
+            partitions.append((name, None, None))
+    return partitions
+
+
+def ensure_partitions(conn, now, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Create the monthly partitions from the current month up to `months_ahead` months ahead"""
+    partitions = list_partitions(conn)
+    has_default = any(name == DEFAULT_PARTITION for name, _, _ in partitions)
+    ranges = [(lower, upper) for name, lower, upper in partitions if name != DEFAULT_PARTITION]
+    created = []
+    for i in range(months_ahead + 1):
+        lower = add_months(month_start(now), i)
+        upper = add_months(lower, 1)
+        overlaps = any((lo is None or lo < upper) and (hi is None or hi > lower) for lo, hi in ranges)
+        if overlaps:
+            continue
+        create = (f"CREATE TABLE {partition_name(lower)} PARTITION OF device_data "
+                  f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')")
+        in_month = "timestamp >= :lower AND timestamp < :upper"
+        bounds = {'lower': lower, 'upper': upper}
+        if has_default and conn.scalar(
+                text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})"), bounds):
+            # PostgreSQL refuses a partition whose rows already sit in the default partition:
+            # detach it, create the month, move the rows over and attach it again
+            conn.execute(text(f"ALTER TABLE device_data DETACH PARTITION {DEFAULT_PARTITION}"))
+            conn.execute(text(create))
+            moved = conn.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING *) "
+                f"INSERT INTO {partition_name(lower)} SELECT * FROM moved"
+            ), bounds).rowcount
+            conn.execute(text(f"ALTER TABLE device_data ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+            logger.warning(f"⚠️ Moved {moved} row(s) from {DEFAULT_PARTITION} into {partition_name(lower)}")
+        else:
+            conn.execute(text(create))
+        ranges.append((lower, upper))
+        created.append(partition_name(lower))
+    return created
+
+
+def drop_expired_partitions(conn, cutoff):
+    """Drop partitions whose whole range is older than `cutoff`. Returns (names, estimated rows)."""
+    dropped, rows = [], 0
+    for name, _, upper in list_partitions(conn):
+        if upper is None or upper > cutoff:
+            continue
+        # Planner estimate: counting a month of rows just to drop them is not worth a scan
+        estimate = conn.scalar(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {'name': name})
+        if estimate is None or estimate < 0:
+            estimate = conn.scalar(text(f"SELECT count(*) FROM {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+        rows += estimate
+    return dropped, rows
+
+
+def delete_expired_default_rows(engine, cutoff, batch_rows=10000, pause=0.05):
+    """Delete rows older than `cutoff` from the default partition in batches; it has no range to drop"""
+    stmt = text(f"DELETE FROM {DEFAULT_PARTITION} WHERE id IN "
+                f"(SELECT id FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff LIMIT :limit)")
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(stmt, {'cutoff': cutoff, 'limit': batch_rows}).rowcount
+        total += deleted
+        if deleted < batch_rows:
+            return total
+        time.sleep(pause)
+
+
+def delete_expired_rows(session, cutoff, batch_rows=10000, pause=0.05, run_write=None):
+    """Delete rows older than `cutoff` in batches, committing after each one (through `run_write` if given)"""
+    expired = select(DeviceData.id).where(DeviceData.timestamp < cutoff).limit(batch_rows)
+    stmt = delete(DeviceData).where(DeviceData.id.in_(expired)).execution_options(synchronize_session=False)
+
+    def delete_batch():
+        return session.execute(stmt).rowcount
+
+    total = 0
+    while True:
+        if run_write:
+            deleted = run_write(delete_batch)
+        else:
+            deleted = delete_batch()
+            session.commit()
+        total += deleted
+        if deleted < batch_rows:
+            return total
+        # Let queued ingest transactions in between batches
+        time.sleep(pause)
+
+
+def partition_table(conn, now):
+    """Convert device_data into a monthly-partitioned table (PostgreSQL, one transaction).
+
+    Existing rows stay in place: the old table is attached as the partition
+    `device_data_legacy` covering everything before next month, and is
+    dropped once all of it has expired. An empty old table is dropped
+    immediately.
+    """
+    if conn.dialect.name != 'postgresql':
+        raise RuntimeError('Partitioning is only supported on PostgreSQL')
+    if is_partitioned(conn):
+        return False
+
+    legacy_upper = add_months(month_start(now), 1)
+    sequence = conn.scalar(text("SELECT pg_get_serial_sequence('device_data', 'id')"))
+    conn.execute(text("LOCK TABLE device_data IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE device_data RENAME TO {LEGACY_PARTITION}"))
+    conn.execute(text(f"ALTER TABLE {LEGACY_PARTITION} RENAME CONSTRAINT device_data_pkey TO {LEGACY_PARTITION}_pkey"))
+    for index in ('ix_device_data_device_id_timestamp', 'ix_device_data_timestamp', 'ix_device_data_device_id'):
+        conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index.replace('device_data', LEGACY_PARTITION)}"))
+
+    conn.execute(text(
+        f"CREATE TABLE device_data (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp)"
+    ))
+    if sequence:
+        # Keep the id sequence alive when the legacy partition is dropped
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY device_data.id"))
+    # The partition key must be part of the primary key
+    conn.execute(text("ALTER TABLE device_data ADD PRIMARY KEY (id, timestamp)"))
+    conn.execute(text("CREATE INDEX ix_device_data_device_id_timestamp ON device_data (device_id, timestamp)"))
+    conn.execute(text("CREATE INDEX ix_device_data_timestamp ON device_data (timestamp)"))
+
+    if conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {LEGACY_PARTITION})")):
+        conn.execute(text(
+            f"ALTER TABLE device_data ATTACH PARTITION {LEGACY_PARTITION} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{legacy_upper:%Y-%m-%d}')"
+        ))
+    else:
+        conn.execute(text(f"DROP TABLE {LEGACY_PARTITION}"))
+    # Catches rows outside every monthly range instead of failing the insert
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF device_data DEFAULT"))
+    ensure_partitions(conn, now)
+    return True
+
+
+@contextmanager
+def job_lock(engine):
+    """Yield True if this process may run the job: one runner across workers (and hosts on PostgreSQL)"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            locked = conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+            try:
+                yield locked
+            finally:
+                if locked:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+        return
+
+    database = engine.url.database
+    if not database or database == ':memory:':
+        yield True
+        return
+    with open(f"{database}.retention.lock", 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RetentionJob:
+    """Periodic retention and partition maintenance, run by one process at a time"""
+
+    def __init__(self, app, db, raw_days, interval_s=3600, batch_rows=10000, run_write=None):
+        self.app = app
+        self.db = db
+        self.raw_days = raw_days
+        self.interval_s = interval_s
+        self.batch_rows = batch_rows
+        self.run_write = run_write
+
+        self._thread = None
+        self._stop = threading.Event()
+        # Started lazily, so each gunicorn worker starts its own thread after fork
+        self._process = PerProcessStart(self._start_thread, alive=lambda: self._thread.is_alive())
+        atexit.register(self.stop)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'skipped': 0,
+            'failed': 0,
+            'rows_reclaimed': 0,
+            'partitions_dropped': 0,
+            'partitions_created': 0,
+            'last_run': None,
+            'last_duration_ms': 0.0,
+            'last_rows_reclaimed': 0,
+            'last_error': None,
+        }
+
+    def start(self):
+        """Start the scheduler thread in this process unless it is running"""
+        self._process.ensure()
+
+    def _start_thread(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"❌ Retention run failed: {str(e)}")
+            self._stop.wait(self.interval_s)
+
+    def run_once(self):
+        """Run one retention pass if no other process is running one. Returns its result or None."""
+        started = time.perf_counter()
+        with job_lock(self.db.engine) as locked:
+            if not locked:
+                with self._stats_lock:
+                    self._stats['skipped'] += 1
+                return None
+            try:
+                result = self._reclaim()
+            except Exception as e:
+                self.db.session.rollback()
+                with self._stats_lock:
+                    self._stats['failed'] += 1
+                    self._stats['last_error'] = str(e)
+                raise
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['runs'] += 1
+            self._stats['rows_reclaimed'] += result['rows']
+            self._stats['partitions_dropped'] += len(result['dropped'])
+            self._stats['partitions_created'] += len(result['created'])
+            self._stats['last_run'] = datetime.utcnow().isoformat()
+            self._stats['last_duration_ms'] = round(duration_ms, 1)
+            self._stats['last_rows_reclaimed'] = result['rows']
+            self._stats['last_error'] = None
+        logger.info(f"🧹 Retention: reclaimed {result['rows']} row(s), dropped {len(result['dropped'])} "
+                    f"partition(s), created {len(result['created'])} in {duration_ms:.0f}ms")
+        return result
+
+    def _reclaim(self):
+        now = datetime.utcnow()
+        result = {'rows': 0, 'dropped': [], 'created': []}
+        with self.db.engine.begin() as conn:
+            partitioned = is_partitioned(conn)
+            if partitioned:
+                result['created'] = ensure_partitions(conn, now)
+        if not self.raw_days:
+            return result
+
+        cutoff = now - timedelta(days=self.raw_days)
+        if partitioned:
+            with self.db.engine.begin() as conn:
+                result['dropped'], result['rows'] = drop_expired_partitions(conn, cutoff)
+                has_default = any(name == DEFAULT_PARTITION for name, _, _ in list_partitions(conn))
+            if has_default:
+                result['rows'] += delete_expired_default_rows(self.db.engine, cutoff, self.batch_rows)
+        else:
+            result['rows'] = delete_expired_rows(self.db.session, cutoff, self.batch_rows, run_write=self.run_write)
+        return result
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({'raw_days': self.raw_days, 'interval_s': self.interval_s})
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Raw data retention and partitioning')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('partition', help='Convert device_data to monthly partitions (PostgreSQL)')
+    run_parser = subparsers.add_parser('run', help='Run one retention pass')
+    run_parser.add_argument('--days', type=int, help='Keep raw data for this many days (default: RETENTION_RAW_DAYS)')
+    args = parser.parse_args()
+
+    from app import app, db, RETENTION_RAW_DAYS, RETENTION_BATCH_ROWS
+    with app.app_context():
+        try:
+            if args.command == 'partition':
+                with db.engine.begin() as conn:
+                    converted = partition_table(conn, datetime.utcnow())
+                    partitions = list_partitions(conn)
+                print("✅ device_data partitioned" if converted else "✅ device_data was already partitioned")
+                for name, lower, upper in partitions:
+                    print(f"  {name:<24} {lower or '-'} .. {upper or '-'}")
+            else:
+                days = RETENTION_RAW_DAYS if args.days is None else args.days
+                if not days:
+                    print("❌ No retention period: set RETENTION_RAW_DAYS or pass --days", file=sys.stderr)
+                    sys.exit(1)
+                result = RetentionJob(app, db, days, batch_rows=RETENTION_BATCH_ROWS).run_once()
+                if result is None:
+                    print("❌ Another process is running retention", file=sys.stderr)
+                    sys.exit(1)
+                print(f"✅ Reclaimed {result['rows']} row(s) older than {days} day(s); "
+                      f"dropped {len(result['dropped'])} partition(s)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ {args.command.capitalize()} failed: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Continuous rollups: per-device count/min/max/sum of every metric over
+1 minute, 1 hour and 1 day buckets, kept up to date by ingest.
+
+Backfill existing data (rebuilds the rollups of the selected devices):
+    cd backend
+    python rollup.py backfill [--device esp32-001]
+
+Run the backfill while ingest is stopped, otherwise readings ingested
+during the rebuild of a device may be counted twice or missed.
+"""
+import sys
+import math
+import argparse
+from operator import itemgetter
+from datetime import datetime
+import numpy as np
+from sqlalchemy import case, delete, func, select
+from models import DeviceData, DeviceRollup, ROLLUP_METRICS, upsert
+
+# Bucket widths in seconds, finest first
+ROLLUP_RESOLUTIONS = [60, 3600, 86400]
+# Per-metric rollup columns, <metric>_<stat>
+ROLLUP_STATS = ['count', 'min', 'max', 'sum']
+
+EPOCH = datetime(1970, 1, 1)
+# Batches at least this large are aggregated with NumPy
+VECTORIZE_MIN_ROWS = 256
+_metric_values = itemgetter(*ROLLUP_METRICS)
+# Column order of the stacked per-bucket statistics in _aggregate_vectorized
+_STAT_COLUMNS = [f'{metric}_{stat}' for stat in ['count', 'min', 'max', 'sum'] for metric in ROLLUP_METRICS]
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the UTC bucket containing a naive UTC timestamp"""
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return datetime.utcfromtimestamp(seconds - seconds % resolution)
+
+
+def aggregate(rows):
+    """Fold readings (dicts of DeviceData column values) into rollup rows"""
+    if len(rows) >= VECTORIZE_MIN_ROWS:
+        return _aggregate_vectorized(rows)
+    buckets = {}
+    for row in rows:
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (row['device_id'], resolution, bucket_start(row['timestamp'], resolution))
+            stats = buckets.get(key)
+            if stats is None:
+                stats = {'device_id': key[0], 'resolution': resolution, 'bucket': key[2]}
+                for metric in ROLLUP_METRICS:
+                    stats[f'{metric}_count'] = 0
+                    stats[f'{metric}_min'] = None
+                    stats[f'{metric}_max'] = None
+                    stats[f'{metric}_sum'] = 0.0
+                buckets[key] = stats
+            for metric in ROLLUP_METRICS:
+                value = row.get(metric)
+                # NaN and infinity are stored in device_data but would poison the bucket's aggregates
+                if value is None or not math.isfinite(value):
+                    continue
+                stats[f'{metric}_count'] += 1
+                stats[f'{metric}_sum'] += value
+                if stats[f'{metric}_min'] is None or value < stats[f'{metric}_min']:
+                    stats[f'{metric}_min'] = value
+                if stats[f'{metric}_max'] is None or value > stats[f'{metric}_max']:
+                    stats[f'{metric}_max'] = value
+    return list(buckets.values())
+
+
+def _aggregate_vectorized(rows):
+    """aggregate() for large batches: sort by (device, time) so every bucket is a contiguous run"""
+    device_index = {}
+    codes = np.fromiter((device_index.setdefault(row['device_id'], len(device_index)) for row in rows),
+                        dtype=np.int64, count=len(rows))
+    seconds = np.fromiter((int((row['timestamp'] - EPOCH).total_seconds()) for row in rows),
+                          dtype=np.int64, count=len(rows))
+    # None becomes NaN
+    try:
+        values = np.array([_metric_values(row) for row in rows], dtype=np.float64)
+    except KeyError:
+        values = np.array([[row.get(metric) for metric in ROLLUP_METRICS] for row in rows], dtype=np.float64)
+
+    order = np.lexsort((seconds, codes))
+    codes, seconds, values = codes[order], seconds[order], values[order]
+    # Like the scalar path: NaN and infinity count as missing
+    present = np.isfinite(values)
+    values[~present] = np.nan
+    devices = list(device_index)
+
+    rollups = []
+    for resolution in ROLLUP_RESOLUTIONS:
+        starts = seconds - seconds % resolution
+        runs = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (starts[1:] != starts[:-1])])
+        counts = np.add.reduceat(present.astype(np.int64), runs, axis=0)
+        empty = counts == 0
+        # Object arrays so that buckets without readings get None instead of NaN
+        mins = np.fmin.reduceat(values, runs, axis=0).astype(object)
+        maxs = np.fmax.reduceat(values, runs, axis=0).astype(object)
+        mins[empty] = None
+        maxs[empty] = None
+        columns = np.hstack([counts.astype(object), mins, maxs,
+                             np.add.reduceat(np.where(present, values, 0.0), runs, axis=0).astype(object)]).tolist()
+        for code, start, stats in zip(codes[runs].tolist(), starts[runs].tolist(), columns):
+            rollup = dict(zip(_STAT_COLUMNS, stats))
+            rollup.update(device_id=devices[code], resolution=resolution, bucket=datetime.utcfromtimestamp(start))
+            rollups.append(rollup)
+    return rollups
+
+
+# Built once per dialect: constructing the 40-column statement costs more than executing it
+_upsert_statements = {}
+
+
+def _upsert_statement(session):
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in _upsert_statements:
+        _upsert_statements[dialect_name] = _build_upsert_statement(session)
+    return _upsert_statements[dialect_name]
+
+
+def _build_upsert_statement(session):
+    stmt = upsert(session, DeviceRollup)
+    table = DeviceRollup.__table__
+    excluded = stmt.excluded
+    updates = {}
+    for metric in ROLLUP_METRICS:
+        old_min, new_min = table.c[f'{metric}_min'], excluded[f'{metric}_min']
+        old_max, new_max = table.c[f'{metric}_max'], excluded[f'{metric}_max']
+        updates[f'{metric}_count'] = table.c[f'{metric}_count'] + excluded[f'{metric}_count']
+        updates[f'{metric}_sum'] = table.c[f'{metric}_sum'] + excluded[f'{metric}_sum']
+        updates[f'{metric}_min'] = case(
+            (old_min.is_(None), new_min),
+            (new_min.is_(None), old_min),
+            (new_min < old_min, new_min),
+            else_=old_min)
+        updates[f'{metric}_max'] = case(
+            (old_max.is_(None), new_max),
+            (new_max.is_(None), old_max),
+            (new_max > old_max, new_max),
+            else_=old_max)
+    return stmt.on_conflict_do_update(index_elements=['device_id', 'resolution', 'bucket'], set_=updates)
+
+
+def apply_rollups(session, rows):
+    """Add readings to their rollup buckets; runs inside the caller's transaction"""
+    rollups = aggregate(rows)
+    if rollups:
+        # Rows lock in the order given: a fixed key order keeps concurrent batches from deadlocking
+        rollups.sort(key=_rollup_key)
+        session.execute(_upsert_statement(session), rollups)
+
+
+def _rollup_key(rollup):
+    return rollup['device_id'], rollup['resolution'], rollup['bucket']
+
+
+def pick_resolution(bucket_seconds):
+    """Coarsest rollup resolution that still fits in one output bucket, or None for raw data"""
+    fitting = [r for r in ROLLUP_RESOLUTIONS if r <= bucket_seconds]
+    return fitting[-1] if fitting else None
+
+
+def backfill(session, device_id=None, chunk_size=10000, log=print):
+    """Rebuild rollups from raw device_data, streaming rows in chunks"""
+    columns = [DeviceData.device_id, DeviceData.timestamp] + [getattr(DeviceData, m) for m in ROLLUP_METRICS]
+    deleted = delete(DeviceRollup)
+    stmt = select(*columns).order_by(DeviceData.device_id, DeviceData.timestamp)
+    if device_id:
+        deleted = deleted.where(DeviceRollup.device_id == device_id)
+        stmt = stmt.where(DeviceData.device_id == device_id)
+
+    session.execute(deleted)
+    total = 0
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    for chunk in result.partitions():
+        apply_rollups(session, [row._asdict() for row in chunk])
+        total += len(chunk)
+        log(f"  {total} rows aggregated")
+    session.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain device_data rollups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backfill_parser = subparsers.add_parser('backfill', help='Rebuild rollups from raw data')
+    backfill_parser.add_argument('--device', help='Only rebuild this device')
+    backfill_parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        print(f"Backfilling rollups for {args.device or 'all devices'}...")
+        try:
+            total = backfill(db.session, args.device, args.chunk_size)
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Backfill failed: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        count = db.session.scalar(select(func.count()).select_from(DeviceRollup))
+        print(f"\n✅ Backfill completed: {total} rows -> {count} rollup buckets")
+
+
+if __name__ == '__main__':
+    main()
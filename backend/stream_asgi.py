@@ -0,0 +1,174 @@
+"""
+Asyncio engine for long-lived connections: SSE on /api/v1/stream and
+WebSocket ingest on /api/v1/ingest/ws (ingest_ws.py).
+
+Serves every subscriber from a single event loop instead of pinning one
+gthread thread per open dashboard. Readings arrive from the gunicorn ingest
+workers through the pub/sub backend, so SSE_PUBSUB must be unix or postgres.
+
+Usage:
+    cd backend
+    SSE_PUBSUB=unix uvicorn stream_asgi:app --port 8081
+
+and route /api/v1/stream and /api/v1/ingest/ws to it (everything else stays
+on gunicorn).
+"""
+import os
+import json
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from app import SSE_PUBSUB, now_utc, pubsub, sse_frame, to_taiwan_time
+import ingest_ws
+import metrics
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+CLIENT_QUEUE_SIZE = 10
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+    (b'connection', b'keep-alive'),
+    (b'access-control-allow-origin', b'*'),
+]
+
+# SSE clients management (only touched from the event loop thread)
+sse_clients = {}
+loop = None
+
+
+def deliver_to_local_clients(device_id, frame):
+    """Called from the pub/sub listener thread; hands off to the event loop"""
+    if loop is not None:
+        loop.call_soon_threadsafe(_fan_out, device_id, frame)
+
+
+def _fan_out(device_id, frame):
+    for client_queue in sse_clients.get(device_id, ()):
+        try:
+            client_queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            metrics.SSE_DROPPED.inc()
+
+
+# Use the app's pub/sub (one per process: the unix backend binds one socket per pid), delivering
+# to this engine's subscribers. Readings ingested over WebSocket here are published through it too.
+pubsub.deliver = deliver_to_local_clients
+
+
+def ensure_started():
+    """Bind the pub/sub listener to the running event loop (once)"""
+    global loop
+    if loop is None:
+        loop = asyncio.get_running_loop()
+        if SSE_PUBSUB == 'local':
+            logger.warning("⚠️ SSE_PUBSUB=local: this process will only stream readings ingested over WebSocket")
+        pubsub.start()
+
+
+async def send_json(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode('utf-8')})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream(scope, receive, send):
+    """SSE endpoint for real-time data"""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    device_id = query.get('device_id', [None])[0]
+    if not device_id:
+        await send_json(send, 400, {'error': 'device_id parameter required'})
+        return
+
+    logger.info(f"🔌 SSE connection opened: device_id={device_id}")
+    ensure_started()
+
+    client_queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    sse_clients.setdefault(device_id, set()).add(client_queue)
+    metrics.SSE_SUBSCRIBERS.inc()
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+
+        async def write(frame):
+            await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+
+        # Send initial connection message
+        await write(sse_frame({'type': 'connected', 'device_id': device_id}))
+
+        while True:
+            next_item = asyncio.ensure_future(client_queue.get())
+            done, _ = await asyncio.wait({next_item, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_item in done:
+                await write(next_item.result())
+                continue
+            next_item.cancel()
+            if disconnected in done:
+                break
+            # Send keepalive every 15 seconds to keep connection alive
+            await write(f": keepalive {to_taiwan_time(now_utc()).isoformat()}\n\n".encode('utf-8'))
+    finally:
+        disconnected.cancel()
+        logger.info(f"🔌 SSE connection closed: device_id={device_id}")
+        clients = sse_clients.get(device_id)
+        if clients is not None:
+            clients.discard(client_queue)
+            if not clients:
+                del sse_clients[device_id]
+        metrics.SSE_SUBSCRIBERS.dec()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            ensure_started()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            pubsub.close()
+            metrics.mark_process_dead(os.getpid())
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/api/v1/ingest/ws':
+            await ingest_ws.serve(scope, receive, send)
+        else:
+            await send({'type': 'websocket.close', 'code': 1008})
+        return
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] == '/api/v1/stream':
+        await stream(scope, receive, send)
+    elif scope['path'] == '/api/v1/health':
+        await send_json(send, 200, {
+            'status': 'healthy',
+            'timestamp': to_taiwan_time(now_utc()).isoformat(),
+            'sse_devices': len(sse_clients),
+            'sse_clients': sum(len(clients) for clients in sse_clients.values()),
+            'ws_ingest_window': ingest_ws.WINDOW,
+        })
+    else:
+        await send_json(send, 404, {'error': 'Not found'})
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+設備端上傳用戶端（韌體橋接程式 / 模擬器共用）
+
+數據先寫入磁碟上的環形緩衝區，再由背景執行緒批次上傳，後端斷線或變慢時不遺失數據：
+- 環形緩衝區：記憶體映射檔 (mmap)，程式重啟後繼續上傳尚未送出的數據；
+  空間用完時覆蓋最舊的數據（計入 dropped）
+- 批次：累積 batch_size 筆或最舊一筆已等待 batch_interval 秒時送出 /api/v1/ingest/batch
+- gzip 壓縮請求內容（Content-Encoding: gzip）
+- 失敗時以指數退避 + 隨機抖動 (full jitter) 重試，後端恢復時設備不會同時湧入；
+  回應 Retry-After 時至少等待該秒數
+
+用法：
+    from device_client import DeviceClient
+
+    client = DeviceClient("https://your-app.zeabur.app", "your-api-key", "readings.ring")
+    client.start()
+    client.add({"device_id": "esp32-001", "ts": 1730000000000, "voltage_v": 12.34})
+    ...
+    client.stop()   # 先嘗試送出剩餘數據（未送出的仍保留在緩衝檔中）
+"""
+
+import os
+import ssl
+import gzip
+import json
+import mmap
+import time
+import random
+import struct
+import logging
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("device_client")
+
+# ========== 環形緩衝區 ==========
+
+class RingBuffer:
+    """
+    記憶體映射檔中的環形緩衝區：每筆記錄為 uint32 長度 + 內容，由舊到新讀出
+
+    檔頭記錄寫入位置 (head)、讀取位置 (tail)、筆數、被覆蓋的筆數與最舊一筆的序號；
+    每筆記錄的序號依寫入順序遞增，上傳期間被覆蓋的記錄不會讓 consume 誤刪其他記錄。
+    先寫記錄再更新檔頭，程式中斷時最多遺失正在寫入的那一筆。
+    """
+
+    MAGIC = b"WMRB"
+    VERSION = 2
+    HEADER = struct.Struct("<4sB3xQQQQQQ")  # magic, 版本, 容量, head, tail, 筆數, 覆蓋筆數, 最舊一筆的序號
+    DATA_OFFSET = 64
+    LENGTH = struct.Struct("<I")
+    WRAP = 0xFFFFFFFF  # 記錄放不下時的標記：從資料區開頭繼續
+
+    def __init__(self, path, capacity=8 * 1024 * 1024):
+        exists = os.path.exists(path) and os.path.getsize(path) > self.DATA_OFFSET
+        self.file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            self.map = mmap.mmap(self.file.fileno(), 0)
+            magic, version, capacity_on_disk, head, tail, count, dropped, first_seq = \
+                self.HEADER.unpack_from(self.map, 0)
+            # 版本 1 沒有序號欄位（該位置為 0），可直接沿用
+            if (magic == self.MAGIC and version in (1, self.VERSION)
+                    and len(self.map) == self.DATA_OFFSET + capacity_on_disk):
+                self.capacity = capacity_on_disk
+                self.head, self.tail, self.count, self.dropped = head, tail, count, dropped
+                self.first_seq = first_seq
+                return
+            logger.warning(f"⚠️ 緩衝檔格式不符，重新建立: {path}")
+            self.map.close()
+        self.file.truncate(self.DATA_OFFSET + capacity)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = capacity
+        self.head = self.tail = self.count = self.dropped = self.first_seq = 0
+        self._write_header()
+
+    def __len__(self):
+        return self.count
+
+    def _write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.VERSION, self.capacity,
+                              self.head, self.tail, self.count, self.dropped, self.first_seq)
+
+    def _read(self, offset):
+        """offset 處的記錄：回傳 (內容, 下一筆的位置)"""
+        if self.capacity - offset < self.LENGTH.size:
+            offset = 0
+        length, = self.LENGTH.unpack_from(self.map, self.DATA_OFFSET + offset)
+        if length == self.WRAP:
+            offset = 0
+            length, = self.LENGTH.unpack_from(self.map, self.DATA_OFFSET)
+        start = self.DATA_OFFSET + offset + self.LENGTH.size
+        return self.map[start:start + length], offset + self.LENGTH.size + length
+
+    def _write(self, offset, payload):
+        self.LENGTH.pack_into(self.map, self.DATA_OFFSET + offset, len(payload))
+        start = self.DATA_OFFSET + offset + self.LENGTH.size
+        self.map[start:start + len(payload)] = payload
+        return offset + self.LENGTH.size + len(payload)
+
+    def _drop_oldest(self):
+        _, self.tail = self._read(self.tail)
+        self.count -= 1
+        self.dropped += 1
+        self.first_seq += 1
+
+    def append(self, payload):
+        """加入一筆記錄；空間不足時覆蓋最舊的記錄"""
+        size = self.LENGTH.size + len(payload)
+        if size > self.capacity // 2:
+            raise ValueError(f"記錄過大：{len(payload)} bytes")
+        while True:
+            if self.count == 0:
+                self.head = self.tail = 0
+            if self.count and self.head <= self.tail:
+                # 已繞回（head == tail 表示已滿）：只能寫到 tail 之前
+                if self.tail - self.head >= size:
+                    break
+            elif self.capacity - self.head >= size:
+                break
+            elif self.tail >= size:
+                # 尾端放不下：標記後從開頭繼續
+                if self.capacity - self.head >= self.LENGTH.size:
+                    self.LENGTH.pack_into(self.map, self.DATA_OFFSET + self.head, self.WRAP)
+                self.head = 0
+                break
+            self._drop_oldest()
+        self.head = self._write(self.head, payload)
+        self.count += 1
+        self._write_header()
+
+    def peek(self, max_records):
+        """最舊的 max_records 筆記錄（不移除）：回傳 (第一筆的序號, 記錄)"""
+        records = []
+        offset = self.tail
+        for _ in range(min(max_records, self.count)):
+            payload, offset = self._read(offset)
+            records.append(payload)
+        return self.first_seq, records
+
+    def consume(self, first_seq, count):
+        """移除序號 first_seq 起的 count 筆記錄（已送出）；期間已被覆蓋的部分不再重複移除"""
+        end = first_seq + count
+        for _ in range(min(max(end - self.first_seq, 0), self.count)):
+            _, self.tail = self._read(self.tail)
+            self.count -= 1
+            self.first_seq += 1
+        if self.count == 0:
+            self.head = self.tail = 0
+        self._write_header()
+
+    def flush(self):
+        """寫回磁碟（斷電時也不遺失）"""
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+# ========== 上傳用戶端 ==========
+
+class DeviceClient:
+    """
+    將數據寫入環形緩衝區，由背景執行緒批次上傳到 /api/v1/ingest/batch
+    """
+
+    def __init__(self, url, api_key, buffer_path, buffer_bytes=8 * 1024 * 1024,
+                 batch_size=100, batch_interval=5.0, gzip_level=6,
+                 backoff_base=1.0, backoff_max=300.0, timeout=10.0):
+        parts = urlsplit(url.rstrip("/"))
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = (parts.path or "") + "/api/v1/ingest/batch"
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.gzip_level = gzip_level
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.ring = RingBuffer(buffer_path, buffer_bytes)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.stopping = False
+        self.thread = None
+        self.connection = None
+        # 重啟時緩衝檔中已有數據：立即上傳
+        self.oldest = 0.0 if len(self.ring) else None
+        self.failures = 0
+        self.next_attempt = 0.0
+
+        # 統計
+        self.requests = 0
+        self.sent = 0
+        self.rejected = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_raw = 0
+        self.last_error = None
+
+    @property
+    def pending(self):
+        return len(self.ring)
+
+    @property
+    def dropped(self):
+        return self.ring.dropped
+
+    def add(self, reading):
+        """加入一筆數據（dict，與 /api/v1/ingest 相同格式）；不會等待網路"""
+        payload = json.dumps(reading, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            self.ring.append(payload)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            if len(self.ring) >= self.batch_size:
+                self.wakeup.notify()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="device-client", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """停止背景上傳；先在 timeout 秒內盡量送出剩餘數據"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.oldest = 0.0 if len(self.ring) else None  # 不再等待湊滿批次
+            self.wakeup.notify()
+        while self.pending and time.monotonic() < deadline and self.thread and self.thread.is_alive():
+            time.sleep(0.05)
+        with self.lock:
+            self.stopping = True
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join(max(deadline - time.monotonic(), 0) + self.timeout)
+        if self.connection is not None:
+            self.connection.close()
+        with self.lock:
+            self.ring.close()
+
+    def _due(self, now):
+        """距離下一次上傳還要等幾秒（0 = 現在）"""
+        if not len(self.ring):
+            return None
+        wait = max(self.next_attempt - now, 0)
+        if len(self.ring) < self.batch_size:
+            wait = max(wait, self.oldest + self.batch_interval - now)
+        return wait
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.stopping:
+                    wait = self._due(time.monotonic())
+                    if wait == 0:
+                        break
+                    self.wakeup.wait(wait)
+                if self.stopping:
+                    return
+                first_seq, records = self.ring.peek(self.batch_size)
+                # 每次送出前把緩衝區寫回磁碟
+                self.ring.flush()
+            self._send(first_seq, records)
+
+    def _send(self, first_seq, records):
+        body = b"[" + b",".join(records) + b"]"
+        compressed = gzip.compress(body, self.gzip_level)
+        try:
+            status, headers, response = self._post(compressed)
+        except (OSError, http.client.HTTPException) as e:
+            self._failed(f"{type(e).__name__}: {e}", None)
+            return
+        try:
+            result = json.loads(response)
+        except ValueError:
+            result = None
+        if not isinstance(result, dict):
+            result = {}
+        if status == 413 and self.batch_size > 1:
+            # 超過後端的 INGEST_BATCH_MAX：縮小批次後立即重送
+            self.batch_size = max(self.batch_size // 2, 1)
+            logger.warning(f"⚠️ 批次過大，改為每批 {self.batch_size} 筆")
+            return
+        if status in (201, 202) or (status == 400 and "results" in result):
+            # 400 + results：全部數據都未通過驗證，重送也不會成功
+            rejected = result.get("rejected", 0)
+            with self.lock:
+                self.ring.consume(first_seq, len(records))
+                self.oldest = time.monotonic() if len(self.ring) else None
+                self.failures = 0
+                self.next_attempt = 0.0
+                self.requests += 1
+                self.sent += len(records) - rejected
+                self.rejected += rejected
+                self.bytes_sent += len(compressed)
+                self.bytes_raw += len(body)
+            if rejected:
+                logger.warning(f"⚠️ {rejected} 筆數據未通過驗證，已略過")
+            return
+        retry_after = headers.get("retry-after")
+        self._failed(f"HTTP {status}: {response[:200].decode('utf-8', 'replace')}",
+                     float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    def _failed(self, error, retry_after):
+        """指數退避 + full jitter；保留數據稍後重送"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        with self.lock:
+            self.failures += 1
+            self.retries += 1
+            self.last_error = error
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1)))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.next_attempt = time.monotonic() + delay
+        logger.warning(f"⚠️ 上傳失敗（第 {self.failures} 次）：{error}；{delay:.1f} 秒後重試，"
+                       f"{self.pending:,} 筆待送")
+
+    def _post(self, body):
+        while True:
+            reused = self.connection is not None
+            if not reused:
+                if self.https:
+                    self.connection = http.client.HTTPSConnection(
+                        self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+                else:
+                    self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request("POST", self.path, body=body, headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                    "x-api-key": self.api_key,
+                })
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.BadStatusLine):
+                self.connection.close()
+                self.connection = None
+                if not reused:
+                    raise
+                # 閒置連線已被伺服器關閉（keep-alive 逾時）：換一條新連線重試一次
+        headers = {name.lower(): value for name, value in response.getheaders()}
+        if headers.get("connection", "").lower() == "close":
+            self.connection.close()
+            self.connection = None
+        return response.status, headers, data
@@ -4,6 +4,25 @@ import { Device, DeviceData, HistoryDataPoint } from './types';
 // 開發環境：使用 Vite proxy (本地)
 // 生產環境：使用 Zeabur 後端 URL
 const API_BASE = import.meta.env.VITE_API_BASE_URL || '/api/v1';
+// SSE 即時串流：設定後改連 stream_asgi.py（Procfile 的 stream 程序），未設定則使用 API_BASE
+const STREAM_BASE = import.meta.env.VITE_STREAM_BASE_URL || API_BASE;
+
+interface HistoryColumns {
+  count: number;
+  columns: { ts: number[] } & Record<string, (number | null)[]>;
+}
+
+// 將欄位式回應轉回圖表使用的資料點
+function columnsToPoints(columns: HistoryColumns['columns']): HistoryDataPoint[] {
+  const names = Object.keys(columns).filter((name) => name !== 'ts');
+  return columns.ts.map((ts, i) => {
+    const point: HistoryDataPoint = { ts, timestamp: new Date(ts).toISOString() };
+    for (const name of names) {
+      (point as unknown as Record<string, number | null>)[name] = columns[name][i];
+    }
+    return point;
+  });
+}
 
 export const api = {
   async getDevices(): Promise<Device[]> {
@@ -30,6 +49,8 @@ export const api = {
       from: fromTs.toString(),
       to: toTs.toString(),
       limit: '1000',
+      // 欄位式格式：每個指標一個陣列，減少傳輸量與後端序列化時間
+      format: 'columnar',
     });
 
     if (metric) {
@@ -38,8 +59,8 @@ export const api = {
 
     const response = await fetch(`${API_BASE}/history?${params}`);
     if (!response.ok) throw new Error('Failed to fetch history');
-    const data = await response.json();
-    return data.history;
+    const data: HistoryColumns = await response.json();
+    return columnsToPoints(data.columns);
   },
 
   async simulateData(deviceId: string = 'esp32-001', count: number = 20): Promise<void> {
@@ -54,6 +75,6 @@ export const api = {
   },
 
   createEventSource(deviceId: string): EventSource {
-    return new EventSource(`${API_BASE}/stream?device_id=${deviceId}`);
+    return new EventSource(`${STREAM_BASE}/stream?device_id=${deviceId}`);
   },
 };
@@ -1,14 +1,24 @@
-import { defineConfig } from 'vite'
+import { defineConfig, loadEnv } from 'vite'
 import react from '@vitejs/plugin-react'
 
-export default defineConfig({
-  plugins: [react()],
-  server: {
-    proxy: {
-      '/api': {
-        target: 'http://localhost:5000',
-        changeOrigin: true,
+export default defineConfig(({ mode }) => {
+  // 本地開發若有啟動 stream_asgi.py：在 .env.local 設定 STREAM_PROXY_TARGET=http://localhost:8081
+  const streamTarget = loadEnv(mode, '.', '').STREAM_PROXY_TARGET || 'http://localhost:5000'
+
+  return {
+    plugins: [react()],
+    server: {
+      proxy: {
+        // 較長的路徑要放在 /api 之前
+        '/api/v1/stream': {
+          target: streamTarget,
+          changeOrigin: true,
+        },
+        '/api': {
+          target: 'http://localhost:5000',
+          changeOrigin: true,
+        },
       },
     },
-  },
+  }
 })
@@ -1,135 +1,633 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-風力發電機數據模擬器
-每秒自動發送數據到後端 API
+風力發電機數據模擬器 / 負載產生器
+
+以 asyncio 模擬大量設備同時上傳數據，用於容量規劃與壓力測試：
+- 連線池 + HTTP keep-alive（不需額外套件）
+- 數千台模擬設備、可設定總速率與每次請求的批次大小
+- 可選擇同時開啟 SSE 訂閱者，量測即時推送延遲
+- 可改用 WebSocket 長連線上傳（--ws）：驗證一次後持續送出，量測確認 (ack) 延遲
+- 可改用設備端緩衝模式（--buffer）：數據先寫入環形緩衝檔，由 device_client.py 批次、gzip 上傳，
+  後端斷線時以指數退避重試，驗證不遺失數據
+- 輸出延遲百分位數 (p50/p90/p99) 與吞吐量
+
+用法：
+    python simulator.py                                   # 單一設備，每 0.5 秒一筆（Zeabur）
+    python simulator.py --local                           # 本地後端 http://localhost:5000
+    python simulator.py --url http://localhost:8080 --devices 2000 --rate 500 --batch 20 \\
+        --connections 32 --sse 50 --duration 60
+    python simulator.py --url http://localhost:8081 --ws --devices 100 --rate 1000 --batch 10
+    python simulator.py --local --buffer readings.ring --buffer-batch 200 --buffer-interval 5
 """
 
+import os
+import ssl
+import json
+import base64
+import hashlib
 import time
 import random
-import requests
-import json
+import asyncio
+import argparse
 from datetime import datetime
+from urllib.parse import urlsplit
+from device_client import DeviceClient
 
 # ========== 設定區 ==========
 
-# API 設定
-#API_URL = "http://localhost:5000/api/v1/ingest"  # 本地測試
-API_URL = "https://cyutfan-backend.zeabur.app/api/v1/ingest"  # Zeabur 部署
-API_KEY = "dev-secret-key"
+# API 設定（可用 --url / --local 覆寫）
+LOCAL_URL = "http://localhost:5000"  # 本地測試
+API_URL = os.getenv("SIMULATOR_URL", "https://cyutfan-backend.zeabur.app")  # Zeabur 部署
+API_KEY = os.getenv("API_KEY", "dev-secret-key")
 
-# 設備 ID
+# 設備 ID（多台設備時為前綴：esp32-0000, esp32-0001, ...）
 DEVICE_ID = "esp32-001"
 
-# 發送間隔（秒）
+# 預設發送間隔（秒）：單一設備時等同舊版模擬器
 INTERVAL = 0.5
 
+# 每隔幾秒顯示一次統計
+REPORT_EVERY = 5
+
 # ========== 數據生成函數 ==========
 
-def generate_sensor_data():
+def generate_sensor_data(device_id):
     """
     生成模擬的感測器數據
     返回符合 API 格式的字典
     """
     # 模擬真實的風機數據變化
-    voltage = round(random.uniform(11.5, 13.5), 2)      # 電壓 (V)
-    current = round(random.uniform(0.8, 2.0), 2)        # 電流 (A)
-    # rpm = random.randint(2800, 4200)                    # 轉速 (RPM) - 已停用
-    pressure = round(random.uniform(1010.0, 1020.0), 2) # 氣壓 (hPa)
-    temp = round(random.uniform(20.0, 35.0), 1)         # 溫度 (°C)
-    humidity = round(random.uniform(40.0, 70.0), 1)     # 濕度 (%)
-    wind_speed = round(random.uniform(2.0, 6.0), 1)     # 風速 (m/s)
-
     return {
-        "device_id": DEVICE_ID,
-        "ts": int(time.time() * 1000),  # 當前時間戳（毫秒）
-        "voltage_v": voltage,
-        "current_a": current,
-        # "rpm": rpm,  # 轉速 - 已停用
-        "pressure_hpa": pressure,
-        "temp_c": temp,
-        "humidity_pct": humidity,
-        "wind_mps": wind_speed
+        "device_id": device_id,
+        "ts": int(time.time() * 1000),                          # 當前時間戳（毫秒）
+        "voltage_v": round(random.uniform(11.5, 13.5), 2),      # 電壓 (V)
+        "current_a": round(random.uniform(0.8, 2.0), 2),        # 電流 (A)
+        "pressure_hpa": round(random.uniform(1010.0, 1020.0), 2),  # 氣壓 (hPa)
+        "temp_c": round(random.uniform(20.0, 35.0), 1),         # 溫度 (°C)
+        "humidity_pct": round(random.uniform(40.0, 70.0), 1),   # 濕度 (%)
+        "wind_mps": round(random.uniform(2.0, 6.0), 1),         # 風速 (m/s)
     }
 
-# ========== 發送函數 ==========
+# ========== HTTP 連線池 ==========
 
-def send_data(data):
+class HTTPConnectionPool:
     """
-    發送數據到 API
+    最小化的 HTTP/1.1 用戶端：保留最多 `size` 條 keep-alive 連線重複使用
     """
-    headers = {
-        "Content-Type": "application/json",
-        "x-api-key": API_KEY
-    }
 
-    try:
-        response = requests.post(API_URL, json=data, headers=headers, timeout=10)
-
-        # 200 OK 或 201 Created 都算成功
-        if response.status_code in [200, 201]:
-            power = data['voltage_v'] * data['current_a']
-            print(f"✅ [{datetime.now().strftime('%H:%M:%S')}] "
-                  f"數據已發送 | 功率: {power:.2f}W | "
-                  f"電壓: {data['voltage_v']}V | "
-                  f"電流: {data['current_a']}A")
-                  # f"轉速: {data['rpm']} RPM")  # 轉速顯示 - 已停用
-            return True
+    def __init__(self, base_url, size, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self.idle = asyncio.Queue()
+        self.slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def connect(self):
+        self.opened += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout
+        )
+
+    async def request(self, method, path, body=None, headers=None):
+        """送出請求並回傳 (狀態碼, 回應內容)；連線失敗時丟出例外"""
+        async with self.slots:
+            reused = not self.idle.empty()
+            connection = self.idle.get_nowait() if reused else await self.connect()
+            while True:
+                reader, writer = connection
+                try:
+                    writer.write(encode_request(self.host_header, method, path, body, headers))
+                    status, response_headers, response_body = await asyncio.wait_for(
+                        read_response(reader), self.timeout
+                    )
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if not reused:
+                        raise
+                    # 閒置連線已被伺服器關閉（keep-alive 逾時）：換一條新連線重試一次
+                    reused = False
+                    connection = await self.connect()
+                except BaseException:
+                    writer.close()
+                    raise
+            if response_headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self.idle.put_nowait(connection)
+            return status, response_body
+
+    async def close(self):
+        while not self.idle.empty():
+            _, writer = self.idle.get_nowait()
+            writer.close()
+
+
+def encode_request(host, method, path, body=None, headers=None):
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if body is not None:
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+
+async def read_headers(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("伺服器關閉了連線")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return status, headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+
+async def read_response(reader):
+    status, headers = await read_headers(reader)
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            data = await reader.readexactly(size + 2)  # 含結尾 \r\n
+            if size == 0:
+                return status, headers, b"".join(chunks)
+            chunks.append(data[:-2])
+    if "content-length" in headers:
+        return status, headers, await reader.readexactly(int(headers["content-length"]))
+    # 沒有長度資訊：讀到連線關閉為止
+    headers["connection"] = "close"
+    return status, headers, await reader.read()
+
+# ========== WebSocket 用戶端 ==========
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class WebSocketClient:
+    """
+    最小化的 WebSocket 用戶端（RFC 6455，不需額外套件）：送出文字訊息，接收文字訊息並回應 ping
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url, headers, timeout):
+        parts = urlsplit(url)
+        secure = parts.scheme in ("https", "wss")
+        port = parts.port or (443 if secure else 80)
+        context = ssl.create_default_context() if secure else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=context), timeout
+        )
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        lines = [f"GET {parts.path or '/'} HTTP/1.1", f"Host: {parts.netloc}", "Upgrade: websocket",
+                 "Connection: Upgrade", f"Sec-WebSocket-Key: {key}", "Sec-WebSocket-Version: 13"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        try:
+            status, response_headers = await asyncio.wait_for(read_headers(reader), timeout)
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+            if status != 101 or response_headers.get("sec-websocket-accept") != accept:
+                raise ConnectionError(f"WebSocket 握手失敗：HTTP {status}")
+        except BaseException:
+            writer.close()
+            raise
+        return cls(reader, writer)
+
+    def _write_frame(self, opcode, payload):
+        # 用戶端送出的 frame 必須加上遮罩
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, 0x80 | length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 0x80 | 126]) + length.to_bytes(2, "big")
         else:
-            print(f"❌ 發送失敗: {response.status_code} - {response.text}")
-            return False
-
-    except requests.exceptions.ConnectionError:
-        print(f"❌ 連線錯誤: 無法連接到 {API_URL}")
-        print(f"   請確認後端是否正在運行")
-        return False
-    except requests.exceptions.Timeout:
-        print(f"❌ 請求超時")
-        return False
-    except Exception as e:
-        print(f"❌ 發送錯誤: {e}")
-        return False
+            header = bytes([0x80 | opcode, 0x80 | 127]) + length.to_bytes(8, "big")
+        mask = os.urandom(4)
+        key = (mask * (length // 4 + 1))[:length]
+        masked = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+        self.writer.write(header + mask + masked)
 
-# ========== 主程式 ==========
+    async def send_text(self, text):
+        self._write_frame(0x1, text.encode("utf-8"))
+        await self.writer.drain()  # 伺服器不再讀取時（流量控制）在此等待
 
-def main():
+    async def receive(self):
+        """下一則文字訊息；連線關閉時回傳 None"""
+        message = b""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            length = second & 0x7F
+            if length >= 126:
+                length = int.from_bytes(await self.reader.readexactly(2 if length == 126 else 8), "big")
+            payload = await self.reader.readexactly(length)
+            opcode = first & 0x0F
+            if opcode == 0x8:  # close
+                return None
+            if opcode == 0x9:  # ping
+                self._write_frame(0xA, payload)
+                continue
+            if opcode in (0x0, 0x1, 0x2):
+                message += payload
+                if first & 0x80:  # FIN：訊息結束
+                    return message.decode("utf-8")
+
+    def close(self):
+        try:
+            self._write_frame(0x8, (1000).to_bytes(2, "big"))
+        except Exception:
+            pass
+        self.writer.close()
+
+# ========== 統計 ==========
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None  # 發送結束時間（不含等待 SSE 的時間）
+        self.requests = 0
+        self.readings = 0
+        self.failed = 0
+        self.lagging = 0  # 排程時間已過才送出（用戶端跟不上設定的速率）
+        self.statuses = {}
+        self.errors = {}
+        self.latency_ms = []
+        self.connections = 0
+        self.sse_events = 0
+        self.sse_delay_ms = []
+        self.sse_errors = 0
+        self.buffered = 0  # 緩衝模式：寫入緩衝區的筆數
+
+    def record(self, status, latency_ms, readings):
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latency_ms.append(latency_ms)
+        if status in (200, 201, 202):
+            self.readings += readings
+        else:
+            self.failed += 1
+
+    def record_ack(self, ack, latency_ms, readings):
+        """WebSocket 確認：以 ack 的 status（success/queued/partial/error/retry）代替狀態碼"""
+        self.requests += 1
+        self.statuses[ack["status"]] = self.statuses.get(ack["status"], 0) + 1
+        self.latency_ms.append(latency_ms)
+        self.readings += ack.get("accepted", 0)
+        if ack["status"] not in ("success", "queued"):
+            self.failed += 1
+
+    def record_error(self, error):
+        self.requests += 1
+        self.failed += 1
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def line(self, window=None):
+        """一行摘要；`window` 為最近的延遲樣本"""
+        elapsed = time.perf_counter() - self.started
+        latency = self.latency_ms if window is None else window
+        return (f"請求 {self.requests:>8,}  失敗 {self.failed:>6,}  "
+                f"{self.readings / elapsed:>9,.0f} 筆/秒  "
+                f"p50 {percentile(latency, 50):>7.1f} ms  p99 {percentile(latency, 99):>7.1f} ms")
+
+# ========== 上傳 ==========
+
+async def next_slot(stats, args, schedule, deadline):
+    """從共用排程取得下一個時間點並等到該時間；超過 deadline 時回傳 None"""
+    interval = args.batch / args.rate
+    index = schedule["next"]
+    schedule["next"] += 1
+    due = schedule["start"] + index * interval
+    if deadline and due >= deadline:
+        return None
+    delay = due - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    elif delay < -interval:
+        stats.lagging += 1
+    return index
+
+
+def make_readings(args, device_ids, index):
+    first = index * args.batch
+    return [generate_sensor_data(device_ids[(first + i) % len(device_ids)]) for i in range(args.batch)]
+
+
+async def send_loop(pool, stats, args, device_ids, schedule, deadline):
     """
-    主程式：每秒發送一次數據
+    單一發送工作：從共用排程取得下一個時間點，到點後送出一個請求
     """
-    print("=" * 70)
-    print("🌪️  風力發電機數據模擬器")
-    print("=" * 70)
-    print(f"📡 API 位址: {API_URL}")
-    print(f"🔑 API Key: {API_KEY}")
-    print(f"📟 設備 ID: {DEVICE_ID}")
-    print(f"⏱️  發送間隔: {INTERVAL} 秒")
-    print("=" * 70)
-    print(f"開始發送數據... (按 Ctrl+C 停止)\n")
+    headers = {"Content-Type": "application/json", "x-api-key": args.api_key}
+    path = "/api/v1/ingest" if args.batch == 1 else "/api/v1/ingest/batch"
+
+    while True:
+        index = await next_slot(stats, args, schedule, deadline)
+        if index is None:
+            return
+        readings = make_readings(args, device_ids, index)
+        body = json.dumps(readings[0] if args.batch == 1 else readings).encode("utf-8")
+
+        sent = time.perf_counter()
+        try:
+            status, _ = await pool.request("POST", path, body, headers)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            stats.record_error(e)
+            continue
+        stats.record(status, (time.perf_counter() - sent) * 1000, args.batch)
 
-    count = 0
 
+async def ws_send_loop(stats, args, device_ids, schedule, deadline):
+    """
+    單一 WebSocket 連線：驗證一次後持續送出數據；未確認的訊息數不超過伺服器公布的 window
+    """
+    url = args.url + "/api/v1/ingest/ws"
+    while True:
+        in_flight = {}  # seq → (送出時間, 筆數)
+        ws = acks = None
+        try:
+            ws = await WebSocketClient.connect(url, {"x-api-key": args.api_key}, args.timeout)
+            stats.connections += 1
+            ready = json.loads(await asyncio.wait_for(ws.receive(), args.timeout))
+            window = asyncio.Semaphore(ready["window"])
+
+            async def read_acks():
+                while True:
+                    text = await ws.receive()
+                    if text is None:
+                        raise ConnectionError("伺服器關閉了 WebSocket")
+                    ack = json.loads(text)
+                    if ack.get("type") != "ack":
+                        continue
+                    sent, count = in_flight.pop(ack["seq"])
+                    stats.record_ack(ack, (time.perf_counter() - sent) * 1000, count)
+                    window.release()
+
+            acks = asyncio.create_task(read_acks())
+            seq = 0
+            while True:
+                index = await next_slot(stats, args, schedule, deadline)
+                if index is None:
+                    break
+                await window.acquire()
+                if acks.done():
+                    acks.result()  # 連線已中斷：丟出錯誤
+                readings = make_readings(args, device_ids, index)
+                seq += 1
+                in_flight[seq] = (time.perf_counter(), args.batch)
+                await ws.send_text(json.dumps(readings[0] if args.batch == 1 else readings))
+            # 等待最後的確認
+            waited = time.perf_counter()
+            while in_flight and not acks.done() and time.perf_counter() - waited < args.timeout:
+                await asyncio.sleep(0.05)
+            return
+        except asyncio.CancelledError:
+            raise
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, KeyError) as e:
+            # 未確認的訊息視為失敗，稍後重新連線
+            for _ in range(max(len(in_flight), 1)):
+                stats.record_error(e)
+            await asyncio.sleep(1)
+        finally:
+            if acks is not None:
+                acks.cancel()
+            if ws is not None:
+                ws.close()
+
+# ========== SSE 訂閱者 ==========
+
+async def sse_subscriber(args, stats, device_id):
+    """
+    開啟一條 /api/v1/stream 連線，計算收到的事件數與推送延遲（事件時間 → 收到時間）
+    """
+    parts = urlsplit(args.url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    context = ssl.create_default_context() if parts.scheme == "https" else None
+    while True:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=context)
+            writer.write(encode_request(parts.netloc, "GET", f"/api/v1/stream?device_id={device_id}",
+                                        headers={"Accept": "text/event-stream"}))
+            status, headers = await read_headers(reader)
+            if status != 200:
+                raise ConnectionError(f"HTTP {status}")
+            chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+            buffer = b""
+            while True:
+                if chunked:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    buffer += (await reader.readexactly(size + 2))[:-2]
+                    if size == 0:
+                        break
+                else:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    buffer += data
+                *frames, buffer = buffer.split(b"\n\n")
+                for frame in frames:
+                    if not frame.startswith(b"data: "):
+                        continue  # keepalive 註解
+                    event = json.loads(frame[6:])
+                    if event.get("type") == "connected":
+                        continue
+                    stats.sse_events += 1
+                    sent_at = datetime.fromisoformat(event["timestamp"]).timestamp()
+                    stats.sse_delay_ms.append((time.time() - sent_at) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.sse_errors += 1
+            await asyncio.sleep(1)  # 稍後重新連線
+        finally:
+            if writer is not None:
+                writer.close()
+
+async def buffer_loop(client, stats, args, device_ids, schedule, deadline):
+    """
+    緩衝模式：依排程產生數據並寫入設備端環形緩衝區，由 DeviceClient 在背景批次上傳
+    """
+    while True:
+        index = await next_slot(stats, args, schedule, deadline)
+        if index is None:
+            return
+        for reading in make_readings(args, device_ids, index):
+            client.add(reading)
+        stats.buffered += args.batch
+
+# ========== 主程式 ==========
+
+async def report_loop(stats, client=None):
+    """每 REPORT_EVERY 秒顯示最近一段時間的統計"""
+    seen = 0
+    while True:
+        await asyncio.sleep(REPORT_EVERY)
+        if client is not None:
+            print(f"📊 [{datetime.now().strftime('%H:%M:%S')}] 產生 {stats.buffered:>8,}  已送出 {client.sent:>8,}  "
+                  f"待送 {client.pending:>7,}  重試 {client.retries:>4,}  覆蓋 {client.dropped:,}")
+            continue
+        window = stats.latency_ms[seen:]
+        seen = len(stats.latency_ms)
+        sse = f"  SSE 事件 {stats.sse_events:,}" if stats.sse_events else ""
+        print(f"📊 [{datetime.now().strftime('%H:%M:%S')}] {stats.line(window=window)}{sse}")
+
+
+async def run(args):
+    if args.devices == 1:
+        device_ids = [args.device_prefix]
+    else:
+        device_ids = [f"{args.device_prefix}{i:04d}" for i in range(args.devices)]
+
+    stats = Stats()
+    pool = HTTPConnectionPool(args.url, args.connections, args.timeout)
+    start = time.perf_counter()
+    deadline = start + args.duration if args.duration else None
+    schedule = {"start": start, "next": 0}
+
+    subscribers = [
+        asyncio.create_task(sse_subscriber(args, stats, device_ids[i % len(device_ids)]))
+        for i in range(args.sse)
+    ]
+    client = None
+    if args.buffer:
+        client = DeviceClient(args.url, args.api_key, args.buffer, buffer_bytes=args.buffer_mb * 1024 * 1024,
+                              batch_size=args.buffer_batch, batch_interval=args.buffer_interval,
+                              timeout=args.timeout).start()
+    reporter = asyncio.create_task(report_loop(stats, client))
+    if client is not None:
+        senders = [asyncio.create_task(buffer_loop(client, stats, args, device_ids, schedule, deadline))]
+    elif args.ws:
+        senders = [
+            asyncio.create_task(ws_send_loop(stats, args, device_ids, schedule, deadline))
+            for _ in range(args.connections)
+        ]
+    else:
+        senders = [
+            asyncio.create_task(send_loop(pool, stats, args, device_ids, schedule, deadline))
+            for _ in range(args.connections)
+        ]
     try:
-        while True:
-            count += 1
+        await asyncio.gather(*senders)
+        stats.finished = time.perf_counter()
+        # 讓最後一批事件有時間送達訂閱者
+        if subscribers:
+            await asyncio.sleep(1)
+    finally:
+        for task in senders + subscribers + [reporter]:
+            task.cancel()
+        await asyncio.gather(*senders, *subscribers, reporter, return_exceptions=True)
+        await pool.close()
+        if client is not None:
+            # 先盡量送出緩衝區中剩餘的數據；未送出的留在緩衝檔，下次執行時繼續上傳
+            client.stop(timeout=args.buffer_interval + args.timeout)
+            stats.finished = stats.finished or time.perf_counter()
+        print_summary(stats, args, stats.connections if args.ws else pool.opened, client)
+
 
-            # 生成數據
-            data = generate_sensor_data()
+def print_summary(stats, args, connections, client=None):
+    elapsed = (stats.finished or time.perf_counter()) - stats.started
+    print("\n" + "=" * 70)
+    print(f"📈 結果（{elapsed:.1f} 秒）")
+    if client is not None:
+        ratio = client.bytes_raw / client.bytes_sent if client.bytes_sent else 0
+        print(f"   緩衝模式: 產生 {stats.buffered:,} 筆，送出 {client.sent:,} 筆（{client.sent / elapsed:,.1f} 筆/秒），"
+              f"未通過驗證 {client.rejected:,}")
+        print(f"   上傳: {client.requests:,} 個批次，重試 {client.retries:,} 次，"
+              f"gzip {client.bytes_raw:,} → {client.bytes_sent:,} bytes（{ratio:.1f}x）")
+        print(f"   緩衝區: 待送 {client.pending:,} 筆，覆蓋（遺失）{client.dropped:,} 筆")
+        if client.last_error:
+            print(f"   最後一次錯誤: {client.last_error}")
+        print("=" * 70)
+        return
+    print(f"   {'訊息數' if args.ws else '請求數'}: {stats.requests:,}（失敗 {stats.failed:,}，連線數 {connections}）")
+    print(f"   吞吐量: {stats.requests / elapsed:,.1f} 請求/秒，{stats.readings / elapsed:,.1f} 筆/秒"
+          f"（目標 {args.rate:,.0f} 筆/秒）")
+    for pct in (50, 90, 99):
+        print(f"   p{pct}: {percentile(stats.latency_ms, pct):.1f} ms")
+    if stats.latency_ms:
+        print(f"   max: {max(stats.latency_ms):.1f} ms")
+    print(f"   狀態碼: {dict(sorted(stats.statuses.items()))}")
+    if stats.errors:
+        print(f"   連線錯誤: {stats.errors}")
+    if stats.lagging:
+        print(f"   ⚠️ {stats.lagging:,} 個請求晚於排程送出：增加 --connections 或降低 --rate")
+    if args.sse:
+        print(f"   SSE: {args.sse} 個訂閱者收到 {stats.sse_events:,} 個事件，"
+              f"推送延遲 p50 {percentile(stats.sse_delay_ms, 50):.1f} ms / "
+              f"p99 {percentile(stats.sse_delay_ms, 99):.1f} ms，重新連線 {stats.sse_errors}")
+    print("=" * 70)
 
-            # 發送數據
-            success = send_data(data)
 
-            if success:
-                # 每 10 筆顯示統計
-                if count % 10 == 0:
-                    print(f"📊 已發送 {count} 筆數據\n")
+def main():
+    parser = argparse.ArgumentParser(description="風力發電機數據模擬器 / 負載產生器")
+    parser.add_argument("--url", default=API_URL, help=f"後端位址（預設 {API_URL}）")
+    parser.add_argument("--local", action="store_true", help=f"使用本地後端 {LOCAL_URL}")
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--devices", type=int, default=1, help="模擬設備數")
+    parser.add_argument("--device-prefix", default=None,
+                        help=f"設備 ID（單一設備）或前綴（預設 {DEVICE_ID} / esp32-）")
+    parser.add_argument("--rate", type=float, default=1 / INTERVAL, help="所有設備合計每秒發送筆數")
+    parser.add_argument("--batch", type=int, default=1, help="每個請求的筆數（>1 時使用 /api/v1/ingest/batch）")
+    parser.add_argument("--connections", type=int, default=8, help="keep-alive 連線數（同時進行的請求上限）")
+    parser.add_argument("--ws", action="store_true",
+                        help="改用 WebSocket 長連線上傳（{url}/api/v1/ingest/ws，由 stream_asgi.py 提供）")
+    parser.add_argument("--buffer", metavar="PATH", default=None,
+                        help="設備端緩衝模式：數據先寫入此環形緩衝檔，再批次、gzip 上傳（斷線時重試）")
+    parser.add_argument("--buffer-mb", type=int, default=8, help="緩衝檔大小（MB），用完時覆蓋最舊的數據")
+    parser.add_argument("--buffer-batch", type=int, default=100, help="緩衝模式每次上傳的最大筆數")
+    parser.add_argument("--buffer-interval", type=float, default=5,
+                        help="緩衝模式最長等待秒數（未湊滿批次時也送出）")
+    parser.add_argument("--sse", type=int, default=0, help="SSE 訂閱者數量（平均分配到各設備）")
+    parser.add_argument("--duration", type=float, default=0, help="執行秒數（0 = 直到 Ctrl+C）")
+    parser.add_argument("--timeout", type=float, default=10, help="請求超時（秒）")
+    args = parser.parse_args()
+    if args.local:
+        args.url = LOCAL_URL
+    args.url = args.url.rstrip("/")
+    if args.buffer and args.ws:
+        parser.error("--buffer 與 --ws 不能同時使用")
+    if args.device_prefix is None:
+        args.device_prefix = DEVICE_ID if args.devices == 1 else "esp32-"
 
-            # 等待下一次發送
-            time.sleep(INTERVAL)
+    print("=" * 70)
+    print("🌪️  風力發電機數據模擬器")
+    print("=" * 70)
+    print(f"📡 API 位址: {args.url}")
+    print(f"📟 設備: {args.devices:,} 台（{args.device_prefix}{'' if args.devices == 1 else '0000...'}）")
+    if args.buffer:
+        print(f"⏱️  速率: {args.rate:,.1f} 筆/秒，緩衝檔 {args.buffer}（{args.buffer_mb} MB），"
+              f"每批最多 {args.buffer_batch} 筆 / {args.buffer_interval:g} 秒")
+    else:
+        print(f"⏱️  速率: {args.rate:,.1f} 筆/秒，每{'訊息' if args.ws else '請求'} {args.batch} 筆，"
+              f"{args.connections} 條{'WebSocket ' if args.ws else ''}連線")
+    if args.sse:
+        print(f"🔌 SSE 訂閱者: {args.sse}")
+    print("=" * 70)
+    print("開始發送數據... (按 Ctrl+C 停止)\n")
 
+    try:
+        asyncio.run(run(args))
     except KeyboardInterrupt:
-        print(f"\n\n⏹️  已停止發送")
-        print(f"📊 總共發送: {count} 筆數據")
-        print("=" * 70)
+        print("\n⏹️  已停止發送")
+
 
 if __name__ == "__main__":
     main()
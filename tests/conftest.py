@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Root-level scripts (device_client.py, simulator.py) and the flat backend modules
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'backend')]
+
+# app.py reads its configuration at import: an in-memory database and a known API key
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('API_KEY', 'test-key')
+os.environ.setdefault('RESPONSE_CACHE_TTL', '0')
+os.environ.setdefault('LATEST_CACHE', 'true')
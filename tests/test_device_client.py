@@ -0,0 +1,78 @@
+import gzip
+import json
+
+from device_client import DeviceClient, RingBuffer
+
+
+def records(ring):
+    return ring.peek(ring.count)[1]
+
+
+def test_ring_keeps_order_across_wrap_and_reopen(tmp_path):
+    path = str(tmp_path / 'ring')
+    ring = RingBuffer(path, capacity=200)
+    for i in range(50):
+        ring.append(b'%02d' % i)
+    kept = records(ring)
+    assert kept == [b'%02d' % i for i in range(50 - len(kept), 50)]
+    assert ring.dropped == 50 - len(kept)
+    ring.close()
+
+    reopened = RingBuffer(path, capacity=200)
+    assert records(reopened) == kept
+    assert reopened.first_seq == 50 - len(kept)
+
+
+def test_overwrite_during_send_consumes_only_sent_records(tmp_path):
+    ring = RingBuffer(str(tmp_path / 'ring'), capacity=200)
+    payload = b'x' * 36  # 40 bytes per record: 5 fit
+    for i in range(5):
+        ring.append(payload[:-1] + bytes([48 + i]))
+    first_seq, sent = ring.peek(5)
+
+    # While the batch is in flight, new readings overwrite records 0-3
+    for i in range(5, 9):
+        ring.append(payload[:-1] + bytes([48 + i]))
+    assert ring.dropped == 4
+
+    ring.consume(first_seq, len(sent))
+    assert [r[-1] - 48 for r in records(ring)] == [5, 6, 7, 8]
+
+
+def test_consume_after_everything_sent_was_overwritten(tmp_path):
+    ring = RingBuffer(str(tmp_path / 'ring'), capacity=200)
+    for i in range(3):
+        ring.append(b'a' * 36)
+    first_seq, sent = ring.peek(3)
+    for i in range(5):
+        ring.append(b'b' * 36)
+
+    ring.consume(first_seq, len(sent))
+    assert records(ring) == [b'b' * 36] * 5
+
+
+def test_client_does_not_lose_readings_overwritten_during_send(tmp_path):
+    client = DeviceClient('http://127.0.0.1:9', 'key', str(tmp_path / 'ring'),
+                          buffer_bytes=600, batch_size=5)
+    posted = []
+    in_flight = {}
+
+    def post(body):
+        posted.extend(json.loads(gzip.decompress(body)))
+        # Readings keep arriving while the request is in flight and evict the whole batch
+        for i in range(100, 130):
+            client.add({'device_id': 'd', 'ts': i})
+        in_flight['buffered'] = records(client.ring)
+        return 201, {}, b'{"accepted": 5, "rejected": 0}'
+
+    client._post = post
+    for i in range(5):
+        client.add({'device_id': 'd', 'ts': i})
+    client._send(*client.ring.peek(client.batch_size))
+
+    assert [r['ts'] for r in posted] == [0, 1, 2, 3, 4]
+    assert client.dropped > 5
+    # The sent batch was already overwritten: every reading buffered meanwhile is kept
+    assert records(client.ring) == in_flight['buffered']
+    assert client.sent == 5
+    client.ring.close()
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from latest_cache import LatestCache
+
+
+def test_rewarm_picks_up_writes_the_cache_missed(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr('latest_cache.time.monotonic', lambda: clock[0])
+    registry = [('a', datetime(2026, 1, 1, 0, 0), {'rpm': 1})]
+    cache = LatestCache(ttl_s=30)
+    cache.warm(lambda: list(registry))
+    cache.put('a', datetime(2026, 1, 1, 0, 5), {'rpm': 2})
+
+    # Written without reaching this process (CLI load, lost pub/sub message)
+    registry[:] = [('b', datetime(2026, 1, 1, 0, 3), {'rpm': 3}), ('a', datetime(2026, 1, 1, 0, 1), {'rpm': 9})]
+    cache.warm(lambda: list(registry))
+    assert cache.get('b') is None
+
+    clock[0] += 31
+    cache.warm(lambda: list(registry))
+    assert cache.get('b') == (datetime(2026, 1, 1, 0, 3), {'rpm': 3})
+    # A newer cached reading is not replaced by an older registry row
+    assert cache.get('a') == (datetime(2026, 1, 1, 0, 5), {'rpm': 2})
+    assert cache.is_complete()
+
+
+def test_simulated_device_is_listed_and_served():
+    from app import app
+    client = app.test_client()
+    client.post('/api/v1/dev/clear')
+    assert client.get('/api/v1/devices').get_json()['devices'] == []  # warms a complete, empty cache
+
+    assert client.post('/api/v1/dev/simulate', json={'device_id': 'sim', 'count': 3}).status_code == 201
+    assert [d['device_id'] for d in client.get('/api/v1/devices').get_json()['devices']] == ['sim']
+    latest = client.get('/api/v1/latest?device_id=sim')
+    assert latest.status_code == 200
+
+    # Readings for an existing device move its timestamp forward
+    client.post('/api/v1/ingest', headers={'x-api-key': 'test-key'},
+                json={'device_id': 'sim', 'ts': 4102444800000, 'rpm': 7})
+    assert client.get('/api/v1/latest?device_id=sim').get_json()['data']['rpm'] == 7
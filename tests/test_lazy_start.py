@@ -0,0 +1,70 @@
+import threading
+
+import retention
+from lazy_start import PerProcessStart
+
+
+def test_concurrent_callers_start_once():
+    calls = []
+    gate = threading.Barrier(8)
+    starter = PerProcessStart(lambda: calls.append(1))
+
+    def call():
+        gate.wait()
+        starter.ensure()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+
+
+def test_restarts_after_fork_or_when_no_longer_alive():
+    alive = [True]
+    calls = []
+    starter = PerProcessStart(lambda: calls.append(1), alive=lambda: alive[0])
+    assert starter.ensure() and not starter.ensure()
+    alive[0] = False
+    assert starter.ensure()
+    alive[0] = True
+    starter.pid = -1  # as seen by a forked child
+    assert not starter.started() and starter.ensure()
+    assert len(calls) == 3
+
+
+class FakeApp:
+    def app_context(self):
+        return threading.Lock()
+
+
+def test_retention_job_starts_one_thread_and_registers_atexit_once(monkeypatch):
+    registered, started = [], []
+    start_thread = retention.RetentionJob._start_thread
+    monkeypatch.setattr(retention.atexit, 'register', registered.append)
+    monkeypatch.setattr(retention.RetentionJob, 'run_once', lambda self: None)
+    monkeypatch.setattr(retention.RetentionJob, '_start_thread',
+                        lambda self: started.append(1) or start_thread(self))
+    job = retention.RetentionJob(FakeApp(), None, 30)
+
+    gate = threading.Barrier(8)
+
+    def call():
+        gate.wait()
+        job.start()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert started == [1]
+
+    # A stopped job restarts, without another atexit hook
+    job.stop()
+    job._thread.join(5)
+    job.start()
+    job.stop()
+    assert started == [1, 1]
+    assert registered == [job.stop]
@@ -0,0 +1,59 @@
+import math
+from datetime import datetime
+
+import pytest
+
+import rollup
+from rollup import aggregate
+
+
+def reading(minute, **values):
+    row = {metric: None for metric in rollup.ROLLUP_METRICS}
+    row.update(device_id='d1', timestamp=datetime(2026, 1, 1, 0, minute), **values)
+    return row
+
+
+@pytest.mark.parametrize('vectorize', [False, True])
+def test_non_finite_values_are_skipped(monkeypatch, vectorize):
+    monkeypatch.setattr(rollup, 'VECTORIZE_MIN_ROWS', 1 if vectorize else 10 ** 9)
+    rows = [reading(0, voltage_v=12.0), reading(0, voltage_v=math.nan),
+            reading(0, voltage_v=math.inf), reading(0, voltage_v=-math.inf, temp_c=math.nan)]
+    minute = next(r for r in aggregate(rows) if r['resolution'] == 60)
+    assert minute['voltage_v_count'] == 1
+    assert minute['voltage_v_sum'] == 12.0
+    assert minute['voltage_v_min'] == minute['voltage_v_max'] == 12.0
+    assert minute['temp_c_count'] == 0
+    assert minute['temp_c_min'] is None and minute['temp_c_max'] is None
+
+
+def test_ingest_of_nan_reading_is_stored():
+    from app import app, db
+    from models import DeviceRollup
+    client = app.test_client()
+    response = client.post('/api/v1/ingest', headers={'x-api-key': 'test-key'},
+                           json={'device_id': 'nan-device', 'ts': 1790000000000, 'voltage_v': 'nan', 'current_a': 1.0})
+    assert response.status_code == 201, response.get_json()
+    with app.app_context():
+        rollups = db.session.query(DeviceRollup).filter_by(device_id='nan-device').all()
+    assert rollups and all(r.voltage_v_count == 0 and r.current_a_count == 1 for r in rollups)
+
+
+def test_rollup_history_covers_exactly_the_requested_range():
+    from app import app, downsampled_history
+    client = app.test_client()
+    start = 1790035200000  # midnight UTC
+    readings = [{'device_id': 'edge-device', 'ts': start + i * 600_000, 'voltage_v': float(i)}
+                for i in range(3 * 144)]  # every 10 minutes for three days
+    response = client.post('/api/v1/ingest/batch', headers={'x-api-key': 'test-key'}, json=readings)
+    assert response.status_code in (200, 201, 207), response.get_json()
+
+    # Mid-day to mid-day, so the first and last day buckets only partly overlap
+    from_ts, to_ts = start + 13 * 3_600_000 + 5 * 60_000, start + 2 * 86_400_000 + 7 * 3_600_000
+    expected = [r['voltage_v'] for r in readings if from_ts <= r['ts'] <= to_ts]
+    with app.app_context():
+        ts, series, _, info = downsampled_history('edge-device', ['voltage_v'], str(from_ts), str(to_ts),
+                                                  1, None, 'bucket')
+    assert info['source'] == 'rollup_86400s'
+    assert series['voltage_v'][0] == pytest.approx(sum(expected) / len(expected))
+    assert series['voltage_v_min'][0] == min(expected)
+    assert series['voltage_v_max'][0] == max(expected)
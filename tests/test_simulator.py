@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+import websockets
+
+from simulator import HTTPConnectionPool, WebSocketClient
+
+
+async def serve(handler):
+    """Raw TCP server on a free port, so tests control every byte of the response"""
+    server = await asyncio.start_server(handler, '127.0.0.1', 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+async def read_request(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = next((int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                   if line.lower().startswith(b'content-length:')), 0)
+    return head, await reader.readexactly(length)
+
+
+def test_chunked_response_is_reassembled():
+    async def handler(reader, writer):
+        await read_request(reader)
+        writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                     b'5;ext=1\r\nhello\r\n'
+                     b'1\r\n \r\n'
+                     b'5\r\nworld\r\n'
+                     b'0\r\n\r\n')
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server, url = await serve(handler)
+        async with server:
+            pool = HTTPConnectionPool(url, 1, 5)
+            assert await pool.request('GET', '/') == (200, b'hello world')
+            await pool.close()
+
+    asyncio.run(main())
+
+
+def test_keep_alive_connection_is_reused():
+    connections = []
+
+    async def handler(reader, writer):
+        connections.append(writer)
+        while True:
+            try:
+                _, body = await read_request(reader)
+            except asyncio.IncompleteReadError:
+                break
+            writer.write(b'HTTP/1.1 201 Created\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+        writer.close()
+
+    async def main():
+        server, url = await serve(handler)
+        async with server:
+            pool = HTTPConnectionPool(url, 1, 5)
+            for i in range(3):
+                assert await pool.request('POST', '/', str(i).encode()) == (201, str(i).encode())
+            await pool.close()
+        assert len(connections) == 1 and pool.opened == 1
+
+    asyncio.run(main())
+
+
+def test_idle_connection_closed_by_server_is_replaced():
+    served = []
+
+    async def handler(reader, writer):
+        # Answer one request, then drop the connection like a keep-alive timeout
+        await read_request(reader)
+        served.append(1)
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server, url = await serve(handler)
+        async with server:
+            pool = HTTPConnectionPool(url, 1, 5)
+            assert await pool.request('GET', '/') == (200, b'ok')
+            await asyncio.sleep(0.05)
+            assert await pool.request('GET', '/') == (200, b'ok')
+            await pool.close()
+        assert len(served) == 2 and pool.opened == 2
+
+    asyncio.run(main())
+
+
+def test_failed_connection_is_not_returned_to_the_pool():
+    calls = []
+
+    async def handler(reader, writer):
+        await read_request(reader)
+        calls.append(1)
+        if len(calls) == 1:
+            # Truncated response on a fresh connection
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nshort')
+            await writer.drain()
+            writer.close()
+            return
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+        await writer.drain()
+        writer.close()
+
+    async def main():
+        server, url = await serve(handler)
+        async with server:
+            pool = HTTPConnectionPool(url, 1, 5)
+            with pytest.raises(asyncio.IncompleteReadError):
+                await pool.request('GET', '/')
+            assert pool.idle.empty()
+            assert await pool.request('GET', '/') == (200, b'ok')
+            await pool.close()
+
+    asyncio.run(main())
+
+
+def test_websocket_fragmented_messages_and_pings():
+    received = []
+
+    async def handler(ws):
+        received.append(await ws.recv())
+        # Answered by the client while it waits in receive()
+        await asyncio.wait_for(await ws.ping(), 5)
+        # One message split over three frames, then an unfragmented one
+        await ws.send(['{"type": ', '"ack", ', '"seq": 1}'])
+        await ws.send('x' * 70000)
+        await ws.close()
+
+    async def main():
+        async with websockets.serve(handler, '127.0.0.1', 0, compression=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = await WebSocketClient.connect(f'ws://127.0.0.1:{port}/', {'X-API-Key': 'k'}, 5)
+            await client.send_text('{"hello": "world"}')
+            # The handler waits for the pong, so this also checks the ping reply
+            assert await client.receive() == '{"type": "ack", "seq": 1}'
+            assert await client.receive() == 'x' * 70000
+            assert await client.receive() is None
+            client.close()
+        assert received == ['{"hello": "world"}']
+
+    asyncio.run(main())